@@ -1,17 +1,124 @@
+import asyncio
+import functools
+import math
+import re
+import threading
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from abc import ABC, abstractmethod
 import anthropic
+import httpx
 import openai
+import orjson
 from dotenv import load_dotenv
 import os
 from pathlib import Path
+from .cache import LLMCache
 
 # Load .env from project root
 load_dotenv(Path(__file__).parent.parent / '.env')
 
 
+@functools.lru_cache(maxsize=1)
+def _get_clients(anthropic_key: str, openai_key: str, max_retries: int = 2,
+                 max_connections: int = 16) -> Tuple[anthropic.AsyncAnthropic, openai.AsyncOpenAI]:
+    """Create the AI clients once per process so every agent shares their
+    connection pool instead of opening its own.
+
+    Both SDKs run on one httpx client, so keep-alive connections (and their
+    TLS sessions) are reused across requests and agents; the pool is sized
+    to the in-flight request cap, since no more connections can be busy.
+    The SDKs retry rate limits, overloads, timeouts and connection errors
+    themselves, with jittered exponential backoff that honors retry-after.
+    """
+    http_client = httpx.AsyncClient(limits=httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_connections
+    ))
+    return (
+        anthropic.AsyncAnthropic(api_key=anthropic_key, max_retries=max_retries,
+                                 http_client=http_client),
+        openai.AsyncOpenAI(api_key=openai_key, max_retries=max_retries,
+                           http_client=http_client)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _request_slots(limit: int) -> asyncio.Semaphore:
+    """Process-wide cap on in-flight provider requests, shared by every
+    agent so concurrent sessions can't burst past the rate limit together"""
+    return asyncio.Semaphore(limit)
+
+
+@functools.lru_cache(maxsize=64)
+def _system_fingerprint(system: str) -> str:
+    """Short digest identifying a system prompt in cache scopes. System
+    prompts are static, so each one is hashed once rather than per request"""
+    return LLMCache.make_key("system", system)[:16]
+
+
+class JSONArrayItemParser:
+    """Incrementally extracts the objects that are elements of a JSON array.
+
+    Text is fed in arbitrary chunks, e.g. from a streamed completion, and
+    each object nested directly inside an array is returned as soon as its
+    closing brace arrives. Objects inside an extracted item stay part of
+    that item; prose or code fences around the JSON are ignored.
+    """
+
+    _STRUCTURAL_RE = re.compile(r'["\\\[\]{}]')
+
+    def __init__(self):
+        self._containers: List[str] = []
+        self._item_depth: Optional[int] = None
+        self._item_parts: List[str] = []
+        self._in_string = False
+        self._escape_next_chunk = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        items = []
+        item_start = 0 if self._item_depth is not None else None
+        escaped_at = 0 if self._escape_next_chunk else None
+
+        for match in self._STRUCTURAL_RE.finditer(text):
+            char, pos = match.group(), match.start()
+            if self._in_string:
+                if pos == escaped_at:
+                    escaped_at = None
+                elif char == "\\":
+                    escaped_at = pos + 1
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if not self._containers and char not in "[{":
+                continue  # stray characters in prose around the JSON
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                if (char == "{" and self._item_depth is None
+                        and self._containers and self._containers[-1] == "["):
+                    self._item_depth = len(self._containers)
+                    item_start = pos
+                self._containers.append(char)
+            else:
+                self._containers.pop()
+                if len(self._containers) == self._item_depth:
+                    self._item_parts.append(text[item_start:pos + 1])
+                    try:
+                        items.append(orjson.loads("".join(self._item_parts)))
+                    except orjson.JSONDecodeError:
+                        pass
+                    self._item_depth = None
+                    self._item_parts = []
+
+        if self._item_depth is not None:
+            self._item_parts.append(text[item_start:])
+        self._escape_next_chunk = escaped_at == len(text)
+        return items
+
+
 class BaseAgent(ABC):
     def __init__(self, config: Dict[str, Any], agent_type: str):
         self.agent_id = f"{agent_type}_{uuid.uuid4().hex[:8]}"
@@ -19,11 +126,11 @@ class BaseAgent(ABC):
         self.config = config
         self.status = "initialized"
         self.current_task = None
-        self.performance_metrics = {
-            "tasks_completed": 0,
-            "success_rate": 0.0,
-            "avg_response_time": 0.0
-        }
+        # Raw counters; rates and averages are derived when read
+        self._metrics_lock = threading.Lock()
+        self._tasks_completed = 0
+        self._tasks_succeeded = 0
+        self._total_response_time_ns = 0
         self.last_activity = datetime.now()
 
         # Debug: Check if environment variables are loaded
@@ -35,27 +142,369 @@ class BaseAgent(ABC):
         if not openai_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
 
-        self.anthropic_client = anthropic.Anthropic(api_key=anthropic_key)
-        self.openai_client = openai.OpenAI(api_key=openai_key)
+        models_config = config["models"]
+        max_concurrent_requests = models_config.get("max_concurrent_requests", 16)
+        self.anthropic_client, self.openai_client = _get_clients(
+            anthropic_key, openai_key, models_config.get("max_retries", 2),
+            max_concurrent_requests
+        )
+        self._request_slots = _request_slots(max_concurrent_requests)
+        # Default response budget when a call doesn't pass its own estimate
+        self.max_tokens = models_config.get("max_tokens", 4000)
+
+        cache_config = config.get("cache", {})
+        self.cache = None
+        self.semantic_cache = False
+        if cache_config.get("enabled", True):
+            self.cache = LLMCache(
+                max_entries=cache_config.get("max_entries", 256),
+                ttl=cache_config.get("ttl", 3600),
+                similarity_threshold=cache_config.get("similarity_threshold", 0.92)
+            )
+            self.semantic_cache = cache_config.get("semantic", False)
+            self.embedding_model = cache_config.get(
+                "embedding_model", "text-embedding-3-small"
+            )
+
+    async def aclose(self) -> None:
+        """Close the AI clients' connection pool. The clients are shared by
+        every agent in the process, so this is called once, at shutdown"""
+        await asyncio.gather(self.anthropic_client.close(), self.openai_client.close())
+        _get_clients.cache_clear()
+
+    async def get_ai_response(self, prompt: str, model_provider: str = None,
+                              system: str = None,
+                              json_schema: Dict[str, Any] = None,
+                              max_tokens: int = None) -> Any:
+        """Get a completion for ``prompt``.
+
+        ``system`` is the request-independent instructions, sent as the
+        system prompt; keeping it byte-identical across calls lets the
+        provider reuse its cached prefix.
+
+        ``json_schema`` is a named schema, ``{"name": ..., "schema": {...}}``.
+        When given, the provider is constrained to answer with a conforming
+        JSON object (OpenAI structured outputs, Anthropic forced tool use)
+        and the parsed object is returned instead of text.
+
+        ``max_tokens`` caps the response length; callers pass an estimate
+        sized to the expected output, defaulting to ``models.max_tokens``.
+        """
+        provider = model_provider or self.config["models"]["default_provider"]
+        if self.cache is None:
+            response = await self._request_completion(
+                prompt, provider, system, json_schema, max_tokens
+            )
+            return orjson.loads(response) if json_schema else response
+
+        scope, cache_key = self._cache_key(
+            prompt, provider, system, json_schema
+        )
+        # Embed only the request-specific text: a long shared system prompt
+        # would make every request look alike
+        response, embedding = await self._cache_lookup(scope, cache_key, prompt)
+
+        if response is None:
+            response = await self._request_completion(
+                prompt, provider, system, json_schema, max_tokens
+            )
+            if response is not None:
+                self.cache.set(cache_key, scope, response, embedding)
+        return orjson.loads(response) if json_schema else response
+
+    async def stream_ai_response(self, prompt: str, model_provider: str = None,
+                                 system: str = None,
+                                 json_schema: Dict[str, Any] = None,
+                                 max_tokens: int = None) -> AsyncIterator[str]:
+        """Yield the completion for ``prompt`` in chunks as it is generated.
+
+        With ``json_schema`` the chunks are pieces of the JSON document. A
+        cached response is yielded whole. Responses are cached only when
+        the stream is consumed to the end, never after an early exit.
+        """
+        provider = model_provider or self.config["models"]["default_provider"]
+        scope, cache_key = self._cache_key(
+            prompt, provider, system, json_schema
+        )
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
+        try:
+            params = self._request_params(
+                prompt, provider, system, json_schema, max_tokens
+            )
+            # The request holds its slot until the stream ends
+            async with self._request_slots:
+                if provider == "anthropic":
+                    async with self.anthropic_client.messages.stream(**params) as stream:
+                        async for event in stream:
+                            if event.type == "text":
+                                text = event.text
+                            elif event.type == "input_json":
+                                text = event.partial_json
+                            else:
+                                continue
+                            if text:
+                                chunks.append(text)
+                                yield text
+                else:
+                    stream = await self.openai_client.chat.completions.create(
+                        **params, stream=True
+                    )
+                    async for chunk in stream:
+                        text = chunk.choices[0].delta.content if chunk.choices else None
+                        if text:
+                            chunks.append(text)
+                            yield text
+        except Exception as e:
+            raise Exception(f"AI response error: {str(e)}")
+
+        if self.cache is not None and chunks:
+            self.cache.set(cache_key, scope, "".join(chunks))
+
+    async def get_ai_responses_batch(self, prompts: List[str],
+                                     model_provider: str = None) -> List[Optional[str]]:
+        """Get completions for many independent prompts, in order.
 
-    async def get_ai_response(self, prompt: str, model_provider: str = None) -> str:
+        Lists of at least ``agents.batch_threshold`` prompts go through the
+        provider's batch API, which is billed at half price but can take
+        minutes to complete; shorter lists are sent concurrently in realtime.
+        Prompts the batch API fails to answer come back as None.
+        """
         provider = model_provider or self.config["models"]["default_provider"]
+        agents_config = self.config.get("agents", {})
+        if len(prompts) < agents_config.get("batch_threshold", 50):
+            return list(await asyncio.gather(
+                *(self.get_ai_response(prompt, provider) for prompt in prompts)
+            ))
+
+        scope = self._cache_scope(provider)
+        responses: List[Optional[str]] = [None] * len(prompts)
+        pending = {}
+        for i, prompt in enumerate(prompts):
+            if self.cache is not None:
+                responses[i] = self.cache.get(LLMCache.make_key(scope, prompt))
+            if responses[i] is None:
+                pending[f"request-{i}"] = i
+
+        if not pending:
+            return responses
 
+        requests = {custom_id: prompts[i] for custom_id, i in pending.items()}
+        poll_interval = agents_config.get("batch_poll_interval", 30)
         try:
             if provider == "anthropic":
-                response = self.anthropic_client.messages.create(
-                    model=self.config["models"]["anthropic_model"],
-                    max_tokens=4000,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                return response.content[0].text
+                results = await self._run_anthropic_batch(requests, poll_interval)
             elif provider == "openai":
-                response = self.openai_client.chat.completions.create(
-                    model=self.config["models"]["openai_model"],
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=4000
-                )
-                return response.choices[0].message.content
+                results = await self._run_openai_batch(requests, poll_interval)
+            else:
+                results = {}
+        except Exception as e:
+            raise Exception(f"AI batch response error: {str(e)}")
+
+        for custom_id, text in results.items():
+            i = pending[custom_id]
+            responses[i] = text
+            if self.cache is not None:
+                self.cache.set(LLMCache.make_key(scope, prompts[i]), scope, text)
+        return responses
+
+    async def _run_anthropic_batch(self, requests: Dict[str, str],
+                                   poll_interval: float) -> Dict[str, str]:
+        batches = self.anthropic_client.beta.messages.batches
+        batch = await batches.create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "model": self.config["models"]["anthropic_model"],
+                    "max_tokens": self.max_tokens,
+                    "messages": [{"role": "user", "content": prompt}]
+                }
+            }
+            for custom_id, prompt in requests.items()
+        ])
+        while batch.processing_status != "ended":
+            await asyncio.sleep(poll_interval)
+            batch = await batches.retrieve(batch.id)
+
+        results = {}
+        async for entry in await batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = entry.result.message.content[0].text
+        return results
+
+    async def _run_openai_batch(self, requests: Dict[str, str],
+                                poll_interval: float) -> Dict[str, str]:
+        lines = [
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.config["models"]["openai_model"],
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": self.max_tokens
+                }
+            })
+            for custom_id, prompt in requests.items()
+        ]
+        batch_file = await self.openai_client.files.create(
+            file=("batch.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        )
+        batch = await self.openai_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.openai_client.batches.retrieve(batch.id)
+
+        results = {}
+        if batch.output_file_id:
+            output = (await self.openai_client.files.content(batch.output_file_id)).text
+            for line in output.splitlines():
+                entry = orjson.loads(line)
+                response = entry.get("response") or {}
+                if response.get("status_code") == 200:
+                    body = response["body"]
+                    results[entry["custom_id"]] = body["choices"][0]["message"]["content"]
+        return results
+
+    def _cache_scope(self, provider: str, json_schema: Dict[str, Any] = None) -> str:
+        model = self.config["models"].get(f"{provider}_model")
+        if json_schema:
+            return f"{model}|{provider}|{json_schema['name']}"
+        return f"{model}|{provider}"
+
+    def _cache_key(self, prompt: str, provider: str, system: str = None,
+                   json_schema: Dict[str, Any] = None) -> Tuple[str, str]:
+        """Return the cache scope and cache key of a request.
+
+        The scope also identifies the system prompt, so semantic lookups only
+        compare prompts sent with the same instructions.
+        """
+        scope = self._cache_scope(provider, json_schema)
+        if system:
+            scope = f"{scope}|{_system_fingerprint(system)}"
+        key_text = prompt
+        if json_schema:
+            key_text = f"{prompt}\n\n{orjson.dumps(json_schema, option=orjson.OPT_SORT_KEYS).decode()}"
+        return scope, LLMCache.make_key(scope, key_text)
+
+    async def _run_cached(self, scope: str, request: Dict[str, Any],
+                          task: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the cached result of an identical ``request`` (compared as
+        canonical JSON) under ``scope``, or run ``task`` and cache its result
+        if it succeeded"""
+        if self.cache is None:
+            return await task()
+        cache_key = LLMCache.make_key(
+            scope, orjson.dumps(request, option=orjson.OPT_SORT_KEYS).decode()
+        )
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
+        result = await task()
+        if result.get("success"):
+            self.cache.set(cache_key, scope, orjson.dumps(result).decode())
+        return result
+
+    async def _cache_lookup(self, scope: str, cache_key: str,
+                            text: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Look a request up in the exact tier and, when ``cache.semantic`` is
+        on, by the similarity of ``text`` within ``scope``.
+
+        Returns the cached response or None, and the embedding of ``text``
+        (if one was computed) to store alongside a fresh response.
+        """
+        response = self.cache.get(cache_key)
+        embedding = None
+        if response is None and self.semantic_cache:
+            embedding = await self._embed_prompt(text)
+            if embedding is not None:
+                response = self.cache.get_similar(scope, embedding)
+        return response, embedding
+
+    async def _embed_prompt(self, prompt: str) -> Optional[List[float]]:
+        """Embed a prompt for semantic cache lookups, normalized to unit length"""
+        try:
+            result = await self.openai_client.embeddings.create(
+                model=self.embedding_model, input=prompt
+            )
+        except Exception:
+            # The semantic tier is best-effort; fall back to exact matching
+            return None
+
+        vector = result.data[0].embedding
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _request_params(self, prompt: str, provider: str, system: str = None,
+                        json_schema: Dict[str, Any] = None,
+                        max_tokens: int = None) -> Dict[str, Any]:
+        if provider not in ("anthropic", "openai"):
+            raise ValueError(f"Unknown model provider: {provider}")
+
+        params = {
+            "model": self.config["models"][f"{provider}_model"],
+            "max_tokens": max_tokens or self.max_tokens,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if system and provider == "anthropic":
+            # Mark the system prompt as a cache breakpoint
+            params["system"] = [{
+                "type": "text",
+                "text": system,
+                "cache_control": {"type": "ephemeral"}
+            }]
+        elif system:
+            # OpenAI caches identical prompt prefixes automatically
+            params["messages"].insert(0, {"role": "system", "content": system})
+        if json_schema and provider == "anthropic":
+            # Forcing a call to a tool whose input is the schema makes the
+            # model answer with a conforming object
+            params["tools"] = [{
+                "name": json_schema["name"],
+                "description": "Submit the response.",
+                "input_schema": json_schema["schema"]
+            }]
+            params["tool_choice"] = {"type": "tool", "name": json_schema["name"]}
+        elif json_schema:
+            params["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {**json_schema, "strict": True}
+            }
+        return params
+
+    async def _request_completion(self, prompt: str, provider: str,
+                                  system: str = None,
+                                  json_schema: Dict[str, Any] = None,
+                                  max_tokens: int = None) -> str:
+        """Send one request and return the response text; structured
+        responses are returned as JSON text"""
+        try:
+            params = self._request_params(
+                prompt, provider, system, json_schema, max_tokens
+            )
+            async with self._request_slots:
+                if provider == "anthropic":
+                    response = await self.anthropic_client.messages.create(**params)
+                else:
+                    response = await self.openai_client.chat.completions.create(**params)
+            if provider == "anthropic":
+                if json_schema:
+                    tool_call = next(
+                        block for block in response.content if block.type == "tool_use"
+                    )
+                    return orjson.dumps(tool_call.input).decode()
+                return response.content[0].text
+            return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"AI response error: {str(e)}")
 
@@ -64,20 +513,37 @@ class BaseAgent(ABC):
         self.current_task = current_task
         self.last_activity = datetime.now()
 
-    def update_metrics(self, task_completed: bool, response_time: float):
-        self.performance_metrics["tasks_completed"] += 1
-        if task_completed:
-            current_success = self.performance_metrics["success_rate"]
-            total_tasks = self.performance_metrics["tasks_completed"]
-            self.performance_metrics["success_rate"] = (
-                (current_success * (total_tasks - 1) + 1.0) / total_tasks
-            )
+    def update_metrics(self, task_completed: bool, response_time_ns: int):
+        with self._metrics_lock:
+            self._tasks_completed += 1
+            self._tasks_succeeded += int(task_completed)
+            self._total_response_time_ns += response_time_ns
 
-        current_avg = self.performance_metrics["avg_response_time"]
-        total_tasks = self.performance_metrics["tasks_completed"]
-        self.performance_metrics["avg_response_time"] = (
-            (current_avg * (total_tasks - 1) + response_time) / total_tasks
-        )
+    def record_task_time(self, task_completed: bool, start_ns: int) -> float:
+        """Record a task started at ``start_ns`` (time.monotonic_ns) and
+        return its duration in seconds"""
+        elapsed_ns = time.monotonic_ns() - start_ns
+        self.update_metrics(task_completed, elapsed_ns)
+        return elapsed_ns / 1e9
+
+    @property
+    def performance_metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            completed = self._tasks_completed
+            succeeded = self._tasks_succeeded
+            total_ns = self._total_response_time_ns
+
+        return {
+            "tasks_completed": completed,
+            "success_rate": succeeded / completed if completed else 0.0,
+            "avg_response_time": total_ns / completed / 1e9 if completed else 0.0
+        }
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit-rate telemetry of this agent's response cache"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
 
     def get_status(self) -> Dict[str, Any]:
         return {
@@ -86,6 +552,7 @@ class BaseAgent(ABC):
             "status": self.status,
             "current_task": self.current_task,
             "performance_metrics": self.performance_metrics,
+            "cache_stats": self.cache_stats(),
             "last_activity": self.last_activity.isoformat()
         }
 
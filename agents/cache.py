@@ -0,0 +1,81 @@
+import hashlib
+import operator
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class LLMCache:
+    """In-process LRU cache of AI responses with TTL expiry.
+
+    Lookups go through an exact tier keyed by SHA256(model|provider|prompt)
+    and, when embeddings are supplied, a semantic tier that returns the
+    response of the most similar cached prompt above the threshold.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600,
+                 similarity_threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # key -> (timestamp, scope, response, normalized embedding or None)
+        self._entries: "OrderedDict[str, Tuple[float, str, str, Optional[List[float]]]]" = OrderedDict()
+        # Exact lookups that hit or missed, and misses rescued by the semantic tier
+        self.hits = 0
+        self.misses = 0
+        self.semantic_hits = 0
+
+    @staticmethod
+    def make_key(scope: str, prompt: str) -> str:
+        return hashlib.sha256(f"{scope}|{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def get_similar(self, scope: str, embedding: List[float]) -> Optional[str]:
+        """Return the cached response whose prompt embedding is closest to
+        ``embedding`` if its cosine similarity clears the threshold"""
+        now = time.monotonic()
+        best_key, best_score = None, self.similarity_threshold
+        for key, (timestamp, entry_scope, _, vector) in list(self._entries.items()):
+            if now - timestamp > self.ttl:
+                del self._entries[key]
+                continue
+            if vector is None or entry_scope != scope:
+                continue
+            # Vectors are stored normalized, so the dot product is the cosine
+            score = sum(map(operator.mul, embedding, vector))
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+        self.semantic_hits += 1
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][2]
+
+    def set(self, key: str, scope: str, response: str,
+            embedding: Optional[List[float]] = None):
+        self._entries[key] = (time.monotonic(), scope, response, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0
+        }
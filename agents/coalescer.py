@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+
+class RequestCoalescer:
+    """Groups requests that arrive close together into batches.
+
+    Each request is submitted under a group key; requests of the same group
+    arriving within ``window`` seconds of the first (or until ``max_batch``
+    of them are waiting) are handed to ``run_batch`` together. ``run_batch``
+    receives the group and the submitted items and returns one result per
+    item, in order; a result that is an exception is raised to the
+    submitter of that item alone. If ``run_batch`` itself raises, every
+    submitter of the batch gets the exception.
+    """
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+                 window: float = 0.05, max_batch: int = 8):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        # Running batches, referenced so they aren't garbage collected
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, group: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(group, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_batch:
+            self._flush(group)
+        elif len(pending) == 1:
+            self._timers[group] = loop.call_later(self.window, self._flush, group)
+        return await future
+
+    def _flush(self, group: Hashable) -> None:
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(group, None)
+        if batch:
+            task = asyncio.ensure_future(self._run(group, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, group: Hashable, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self.run_batch(group, [item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # the submitter was cancelled
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,17 +1,36 @@
-import json
-from typing import Dict, Any, List
+import asyncio
+import time
+from contextlib import aclosing
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, JSONArrayItemParser
+from .coalescer import RequestCoalescer
+from .output_schemas import TEXT, RATING, TEXT_LIST, array_of, named_schema, strict_object
+
+
+def _idea_list_schema(name: str, fields: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a named structured-output schema for an ``ideas`` array whose
+    items have exactly ``fields``"""
+    return named_schema(name, strict_object({"ideas": array_of(strict_object(fields))}))
+
+
+# Appended to a type's instructions when one call answers several requests
+_BATCH_INSTRUCTIONS = """
+
+The user's message holds several numbered requests. Answer each one
+separately, tagged with its request number."""
 
 
 class IdeaCoachAgent(BaseAgent):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config, "idea_coach")
+        # Static instructions are sent as the system prompt and only the
+        # request-specific fields as the user message, so every call of a
+        # given type shares a cacheable prefix
         self.idea_generation_prompts = {
             "creative": """You are an expert idea generation coach. Generate
-{num_ideas} innovative and creative ideas based on the following prompt:
-
-{prompt}
+innovative and creative ideas based on the prompt in the user's
+message, producing exactly the requested number of ideas.
 
 For each idea, provide:
 1. Title: A catchy, memorable name
@@ -19,14 +38,11 @@ For each idea, provide:
 3. Target Market: Who would use this
 4. Unique Value Proposition: What makes it special
 5. Innovation Level: Rate 1-10 (10 being most innovative)
-6. Implementation Difficulty: Rate 1-10 (10 being most difficult)
-
-Format your response as a JSON array of idea objects.""",
+6. Implementation Difficulty: Rate 1-10 (10 being most difficult)""",
 
             "business": """You are a business idea generation expert.
-Create {num_ideas} viable business ideas for:
-
-{prompt}
+Create viable business ideas for the prompt in the user's message,
+producing exactly the requested number of ideas.
 
 Each idea should include:
 1. Business Name: Professional, marketable name
@@ -35,14 +51,11 @@ Each idea should include:
 4. Market Size: Estimated target market
 5. Competitive Advantage: Key differentiators
 6. Startup Costs: Rough estimate (Low/Medium/High)
-7. Scalability: Growth potential (1-10)
-
-Return as JSON array of business idea objects.""",
+7. Scalability: Growth potential (1-10)""",
 
             "product": """As a product innovation specialist, develop
-{num_ideas} product ideas for:
-
-{prompt}
+product ideas for the prompt in the user's message,
+producing exactly the requested number of ideas.
 
 For each product idea:
 1. Product Name: Market-ready name
@@ -52,54 +65,195 @@ For each product idea:
 5. Key Features: Top 3-5 features
 6. Technology Stack: Required technologies
 7. Development Timeline: Estimated timeframe
-8. Market Readiness: How ready is the market (1-10)
+8. Market Readiness: How ready is the market (1-10)"""
+        }
+        # Structured-output schemas mirroring each template's field list
+        self.idea_schemas = {
+            "creative": _idea_list_schema("submit_creative_ideas", {
+                "title": TEXT,
+                "concept": TEXT,
+                "target_market": TEXT,
+                "unique_value_proposition": TEXT,
+                "innovation_level": RATING,
+                "implementation_difficulty": RATING
+            }),
+            "business": _idea_list_schema("submit_business_ideas", {
+                "business_name": TEXT,
+                "description": TEXT,
+                "revenue_model": TEXT,
+                "market_size": TEXT,
+                "competitive_advantage": TEXT,
+                "startup_costs": {"type": "string", "enum": ["Low", "Medium", "High"]},
+                "scalability": RATING
+            }),
+            "product": _idea_list_schema("submit_product_ideas", {
+                "product_name": TEXT,
+                "description": TEXT,
+                "target_users": TEXT,
+                "problem_solved": TEXT,
+                "key_features": TEXT_LIST,
+                "technology_stack": TEXT_LIST,
+                "development_timeline": TEXT,
+                "market_readiness": RATING
+            })
+        }
+        self.idea_request_template = """Number of ideas: {num_ideas}
+
+Prompt:
+{prompt}"""
+        # Split once around the two fields so building a request is a plain
+        # join rather than a str.format parse on every call
+        head, rest = self.idea_request_template.split("{num_ideas}")
+        middle, tail = rest.split("{prompt}")
+        self._request_segments = (head, middle, tail)
 
-Provide response as JSON array."""
+        # Schemas for answering several numbered requests of a type at once
+        self.idea_batch_schemas = {
+            idea_type: named_schema(f"{schema['name']}_batch", strict_object({
+                "requests": array_of(strict_object({
+                    "request_number": {"type": "integer"},
+                    "ideas": schema["schema"]["properties"]["ideas"]
+                }))
+            }))
+            for idea_type, schema in self.idea_schemas.items()
         }
+        # Opt-in: requests arriving within agents.idea_batch_window seconds
+        # of each other share one AI call per idea type
+        agents_config = config.get("agents", {})
+        self._coalescer = None
+        if agents_config.get("idea_batch_window", 0) > 0:
+            self._coalescer = RequestCoalescer(
+                self._generate_idea_batch,
+                window=agents_config["idea_batch_window"],
+                max_batch=agents_config.get("idea_batch_size", 4)
+            )
+
+    def _ideas_max_tokens(self, num_ideas: int) -> int:
+        """Response budget for ``num_ideas`` ideas: roughly 300 tokens per
+        idea plus the JSON wrapper"""
+        return min(300 * num_ideas + 200, self.max_tokens)
+
+    async def _generate_idea_batch(self, idea_type: str,
+                                   requests: List[Tuple[str, int]]) -> List[Any]:
+        """Generate ideas for several (request message, number of ideas)
+        pairs of one type; returns each request's ideas, in order.
+
+        Requests share AI calls in consecutive groups whose combined
+        response budget fits within models.max_tokens, so a large batch
+        can't exceed the output limit and fail requests that would fit
+        on their own. A failed call fails only its group's requests.
+        """
+        groups = []
+        budget = 0
+        for request in requests:
+            request_budget = self._ideas_max_tokens(request[1])
+            if groups and budget + request_budget <= self.max_tokens:
+                groups[-1].append(request)
+                budget += request_budget
+            else:
+                groups.append([request])
+                budget = request_budget
+
+        outcomes = await asyncio.gather(
+            *(self._generate_idea_group(idea_type, group) for group in groups),
+            return_exceptions=True
+        )
+        results = []
+        for group, outcome in zip(groups, outcomes):
+            results.extend([outcome] * len(group) if isinstance(outcome, Exception) else outcome)
+        return results
+
+    async def _generate_idea_group(self, idea_type: str,
+                                   requests: List[Tuple[str, int]]) -> List[Any]:
+        """One AI call answering ``requests``, which fit within models.max_tokens"""
+        instructions = self.idea_generation_prompts[idea_type]
+        if len(requests) == 1:
+            formatted_prompt, num_ideas = requests[0]
+            response = await self.get_ai_response(
+                formatted_prompt, system=instructions,
+                json_schema=self.idea_schemas[idea_type],
+                max_tokens=self._ideas_max_tokens(num_ideas)
+            )
+            return [response["ideas"]]
+
+        response = await self.get_ai_response(
+            "\n\n".join(
+                f"Request {number}:\n{formatted_prompt}"
+                for number, (formatted_prompt, _) in enumerate(requests, start=1)
+            ),
+            system=instructions + _BATCH_INSTRUCTIONS,
+            json_schema=self.idea_batch_schemas[idea_type],
+            max_tokens=sum(self._ideas_max_tokens(num_ideas) for _, num_ideas in requests)
+        )
+        by_number = {entry["request_number"]: entry["ideas"] for entry in response["requests"]}
+        results = []
+        for number in range(1, len(requests) + 1):
+            ideas = by_number.get(number)
+            results.append(ideas if ideas is not None else ValueError("No ideas returned for request"))
+        return results
 
     async def execute_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         self.update_status(
             "processing", f"Generating ideas for: {task_data.get('prompt', 'unknown')}"
         )
-        start_time = datetime.now()
+        start_ns = time.monotonic_ns()
+        idea_queue = task_data.get("idea_queue")
 
         try:
             prompt = task_data.get("prompt", "")
             num_ideas = task_data.get("num_ideas", self.config["agents"]["num_ideas"])
             idea_type = task_data.get("idea_type", "creative")
 
-            # Select appropriate prompt template
-            template = self.idea_generation_prompts.get(
-                idea_type, self.idea_generation_prompts["creative"]
-            )
-            formatted_prompt = template.format(prompt=prompt, num_ideas=num_ideas)
-
-            # Get AI response
-            response = await self.get_ai_response(formatted_prompt)
+            # Select appropriate prompt template and output schema
+            if idea_type not in self.idea_generation_prompts:
+                idea_type = "creative"
+            instructions = self.idea_generation_prompts[idea_type]
+            schema = self.idea_schemas[idea_type]
+            head, middle, tail = self._request_segments
+            formatted_prompt = "".join((head, str(num_ideas), middle, prompt, tail))
 
-            # Parse JSON response
-            try:
-                ideas = json.loads(response)
-                if not isinstance(ideas, list):
-                    ideas = [ideas]
-            except json.JSONDecodeError:
-                # Fallback: extract ideas from text response
-                ideas = self._extract_ideas_from_text(response, num_ideas)
-
-            # Enhance ideas with metadata
+            # Ideas are stamped with one clock read for the whole batch and
+            # the index keeps their ids unique within it
+            generated_at = datetime.now()
+            batch_stamp = generated_at.timestamp()
+            generated_iso = generated_at.isoformat()
             enhanced_ideas = []
-            for i, idea in enumerate(ideas[:num_ideas]):
+
+            def enhance(idea: Dict[str, Any]) -> None:
                 enhanced_idea = {
-                    "id": f"idea_{datetime.now().timestamp()}_{i}",
+                    "id": f"idea_{batch_stamp}_{len(enhanced_ideas)}",
                     "generated_by": self.agent_id,
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": generated_iso,
                     "type": idea_type,
                     **idea
                 }
                 enhanced_ideas.append(enhanced_idea)
+                if idea_queue is not None:
+                    idea_queue.put_nowait(enhanced_idea)
 
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(True, response_time)
+            if self._coalescer is not None and idea_queue is None:
+                # Nobody is waiting on individual ideas, so the request can
+                # share one AI call with others of the same type
+                ideas = await self._coalescer.submit(idea_type, (formatted_prompt, num_ideas))
+                for idea in ideas[:num_ideas]:
+                    enhance(idea)
+            else:
+                # Stream the structured AI response, publishing each idea as
+                # soon as its JSON object is complete. The stream is read to
+                # the end even once we have enough, since only a complete
+                # response is cached
+                parser = JSONArrayItemParser()
+                stream = self.stream_ai_response(
+                    formatted_prompt, system=instructions, json_schema=schema,
+                    max_tokens=self._ideas_max_tokens(num_ideas)
+                )
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        for idea in parser.feed(chunk):
+                            if len(enhanced_ideas) < num_ideas:
+                                enhance(idea)
+
+            response_time = self.record_task_time(True, start_ns)
             self.update_status("completed", None)
 
             return {
@@ -111,8 +265,7 @@ Provide response as JSON array."""
             }
 
         except Exception as e:
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(False, response_time)
+            response_time = self.record_task_time(False, start_ns)
             self.update_status("error", f"Error: {str(e)}")
 
             return {
@@ -122,52 +275,23 @@ Provide response as JSON array."""
                 "processing_time": response_time
             }
 
-    def _extract_ideas_from_text(
-        self, text: str, num_ideas: int
-    ) -> List[Dict[str, Any]]:
-        """Fallback method to extract ideas from non-JSON text response"""
-        ideas = []
-        lines = text.split('\n')
-        current_idea = {}
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Look for idea separators or numbers
-            if (any(str(i) in line for i in range(1, num_ideas + 1))
-                    and len(current_idea) > 0):
-                ideas.append(current_idea)
-                current_idea = {}
-
-            # Extract key-value pairs
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip().lower().replace(' ', '_')
-                value = value.strip()
-                current_idea[key] = value
-
-        if current_idea:
-            ideas.append(current_idea)
-
-        # Ensure we have the right number of ideas
-        while len(ideas) < num_ideas:
-            ideas.append({
-                "title": f"Generated Idea {len(ideas) + 1}",
-                "concept": "Creative solution generated from input prompt",
-                "innovation_level": 5
-            })
-
-        return ideas[:num_ideas]
+        finally:
+            if idea_queue is not None:
+                idea_queue.put_nowait(None)  # no more ideas
 
     async def generate_ideas(
-        self, prompt: str, num_ideas: int = None, idea_type: str = "creative"
+        self, prompt: str, num_ideas: int = None, idea_type: str = "creative",
+        idea_queue: Optional[asyncio.Queue] = None
     ) -> Dict[str, Any]:
-        """Public method to generate ideas"""
+        """Public method to generate ideas.
+
+        If ``idea_queue`` is given, each idea is also put on it as soon as
+        it has been generated, followed by ``None`` once generation ends.
+        """
         task_data = {
             "prompt": prompt,
             "num_ideas": num_ideas or self.config["agents"]["num_ideas"],
-            "idea_type": idea_type
+            "idea_type": idea_type,
+            "idea_queue": idea_queue
         }
         return await self.execute_task(task_data)
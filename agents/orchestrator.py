@@ -1,12 +1,52 @@
+import asyncio
+import time
 import uuid
-from typing import Dict, Any, List, Optional
+from operator import attrgetter
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional
 from datetime import datetime
+import orjson
 from .base_agent import BaseAgent
+from .cache import LLMCache
+from .types import Session, ValidatedIdea
+from .session_store import SessionStore
 from .idea_coach import IdeaCoachAgent
 from .validation import ValidationAgent
 from .product_manager import ProductManagerAgent
 
 
+def _workflow_succeeded(result: Dict[str, Any]) -> bool:
+    """Whether a workflow ran and every one of its steps succeeded"""
+    if not result.get("success"):
+        return False
+    return all(
+        step["status"] == "completed" and step["result"].get("success")
+        for step in result["workflow_result"]["steps"]
+    )
+
+
+# Keys under which the idea coach's first item may wrap the actual list
+_NESTED_IDEA_KEYS = ("ideas", "business_ideas", "product_ideas")
+
+
+def _workflow_ideas(workflow_result: Dict[str, Any]) -> List[Any]:
+    """Ideas from the idea_coach step of a workflow, unwrapping a list
+    nested in the first item"""
+    step = next(
+        (step for step in workflow_result["steps"]
+         if step["agent"] == "idea_coach" and "result" in step),
+        None
+    )
+    if step is None:
+        return []
+    ideas = step["result"].get("ideas", [])
+    first_item = ideas[0] if ideas else None
+    if isinstance(first_item, dict):
+        for key in _NESTED_IDEA_KEYS:
+            if key in first_item:
+                return first_item[key]
+    return ideas
+
+
 class OrchestratorAgent(BaseAgent):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config, "orchestrator")
@@ -15,9 +55,30 @@ class OrchestratorAgent(BaseAgent):
         self.idea_coach = IdeaCoachAgent(config)
         self.validator = ValidationAgent(config)
         self.product_manager = ProductManagerAgent(config)
+        
+        # Workflow step handlers keyed by the agent named in each step
+        self._step_dispatch: Dict[str, Callable] = {
+            "idea_coach": self._execute_idea_generation_step,
+            "validator": self._execute_validation_step,
+            "product_manager": self._execute_prd_creation_step
+        }
 
-        # Session management
-        self.active_sessions = {}
+        # Session management: SQLite-backed, expiring after
+        # memory.session_timeout and capped at memory.max_sessions
+        memory_config = config.get("memory", {})
+        self.session_store = SessionStore(
+            path=memory_config.get("session_db", ":memory:"),
+            ttl=memory_config.get("session_timeout", 3600),
+            max_sessions=memory_config.get("max_sessions", 100)
+        )
+        
+        # Cap on ideas validated per workflow and on concurrent validations;
+        # batch validation scores all of them in a single AI call
+        self.max_validations = 3
+        self.batch_validation = config.get("agents", {}).get("batch_validation", True)
+        self._validation_semaphore = asyncio.Semaphore(
+            config.get("agents", {}).get("max_concurrency", 5)
+        )
         self.workflow_templates = {
             "full_pipeline": [
                 {"agent": "idea_coach", "task": "generate_ideas"},
@@ -37,7 +98,7 @@ class OrchestratorAgent(BaseAgent):
 
     async def execute_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         self.update_status("processing", "Orchestrating multi-agent workflow")
-        start_time = datetime.now()
+        start_ns = time.monotonic_ns()
 
         try:
             workflow_type = task_data.get("workflow_type", "full_pipeline")
@@ -50,10 +111,9 @@ class OrchestratorAgent(BaseAgent):
             workflow_result = await self._execute_workflow(workflow_type, task_data, session)
             
             # Update session with results
-            self._update_session(session_id, workflow_result)
+            self._update_session(session, workflow_result)
             
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(True, response_time)
+            response_time = self.record_task_time(True, start_ns)
             self.update_status("completed", None)
             
             return {
@@ -65,8 +125,7 @@ class OrchestratorAgent(BaseAgent):
             }
             
         except Exception as e:
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(False, response_time)
+            response_time = self.record_task_time(False, start_ns)
             self.update_status("error", f"Error: {str(e)}")
             
             return {
@@ -76,31 +135,22 @@ class OrchestratorAgent(BaseAgent):
                 "processing_time": response_time
             }
     
-    def _create_session(self, session_id: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_session(self, session_id: str, task_data: Dict[str, Any]) -> Session:
         """Create new session for tracking workflow execution"""
-        session = {
-            "session_id": session_id,
-            "created_at": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat(),
-            "initial_request": task_data,
-            "workflow_history": [],
-            "current_stage": "initialized",
-            "results": {},
-            "human_interactions": []
-        }
-        
-        self.active_sessions[session_id] = session
+        initial_request = {key: value for key, value in task_data.items() if key != "idea_queue"}
+        session = Session(session_id=session_id, initial_request=initial_request)
+        self.session_store.put(session)
+        self.session_store.prune()
         return session
     
-    def _update_session(self, session_id: str, workflow_result: Dict[str, Any]):
+    def _update_session(self, session: Session, workflow_result: Dict[str, Any]):
         """Update session with workflow results"""
-        if session_id in self.active_sessions:
-            session = self.active_sessions[session_id]
-            session["last_updated"] = datetime.now().isoformat()
-            session["results"] = workflow_result
-            session["current_stage"] = "completed"
+        session.last_updated = datetime.now().isoformat()
+        session.results = workflow_result
+        session.current_stage = "completed"
+        self.session_store.put(session)
     
-    async def _execute_workflow(self, workflow_type: str, task_data: Dict[str, Any], session: Dict[str, Any]) -> Dict[str, Any]:
+    async def _execute_workflow(self, workflow_type: str, task_data: Dict[str, Any], session: Session) -> Dict[str, Any]:
         """Execute specified workflow with agent coordination"""
         if workflow_type not in self.workflow_templates:
             raise ValueError(f"Unknown workflow type: {workflow_type}")
@@ -109,37 +159,54 @@ class OrchestratorAgent(BaseAgent):
         results = {"workflow_type": workflow_type, "steps": []}
         
         # Store data between steps
-        workflow_context = {"task_data": task_data}
+        workflow_context = {"task_data": task_data, "workflow_type": workflow_type}
         
-        for step_idx, step in enumerate(workflow_steps):
-            step_result = await self._execute_workflow_step(
-                step, workflow_context, session, step_idx
-            )
-            results["steps"].append(step_result)
-            
-            # Update context for next step
-            workflow_context[f"step_{step_idx}_result"] = step_result
+        try:
+            for step_idx, step in enumerate(workflow_steps):
+                step_result = await self._execute_workflow_step(
+                    step, workflow_context, session, step_idx
+                )
+                results["steps"].append(step_result)
+                
+                # Update context for next step
+                workflow_context[f"step_{step_idx}_result"] = step_result
+                self.session_store.put(session)
+                
+                # Handle human-in-the-loop checkpoints
+                if step_result.get("requires_human_input"):
+                    await self._handle_human_interaction(step_result, session)
             
-            # Handle human-in-the-loop checkpoints
-            if step_result.get("requires_human_input"):
-                await self._handle_human_interaction(step_result, session)
+            # Collect the ideas that kept generating while later steps ran
+            generation = workflow_context.pop("pending_generation", None)
+            if generation is not None:
+                idea_result = await generation
+                for step_result in results["steps"]:
+                    if step_result["agent"] == "idea_coach" and step_result["status"] == "completed":
+                        if idea_result.get("success"):
+                            step_result["result"] = idea_result
+                        else:
+                            # Later steps already used the early ideas; keep
+                            # them and report why the rest are missing
+                            step_result["result"]["generation_error"] = idea_result.get("error")
+                if idea_result.get("success"):
+                    session.ideas = idea_result.get("ideas", [])
+        finally:
+            generation = workflow_context.pop("pending_generation", None)
+            if generation is not None:
+                generation.cancel()
         
         return results
     
-    async def _execute_workflow_step(self, step: Dict[str, Any], context: Dict[str, Any], session: Dict[str, Any], step_idx: int) -> Dict[str, Any]:
+    async def _execute_workflow_step(self, step: Dict[str, Any], context: Dict[str, Any], session: Session, step_idx: int) -> Dict[str, Any]:
         """Execute individual workflow step"""
         agent_name = step["agent"]
         task_name = step["task"]
         
         try:
-            if agent_name == "idea_coach":
-                result = await self._execute_idea_generation_step(context, session)
-            elif agent_name == "validator":
-                result = await self._execute_validation_step(context, session)
-            elif agent_name == "product_manager":
-                result = await self._execute_prd_creation_step(context, session)
-            else:
+            handler = self._step_dispatch.get(agent_name)
+            if handler is None:
                 raise ValueError(f"Unknown agent: {agent_name}")
+            result = await handler(context, session)
             
             return {
                 "step_index": step_idx,
@@ -160,79 +227,136 @@ class OrchestratorAgent(BaseAgent):
                 "timestamp": datetime.now().isoformat()
             }
     
-    async def _execute_idea_generation_step(self, context: Dict[str, Any], session: Dict[str, Any]) -> Dict[str, Any]:
+    async def _execute_idea_generation_step(self, context: Dict[str, Any], session: Session) -> Dict[str, Any]:
         """Execute idea generation step"""
         task_data = context["task_data"]
+        generation_args = {
+            "prompt": task_data.get("prompt", ""),
+            "num_ideas": task_data.get("num_ideas", self.config["agents"]["num_ideas"]),
+            "idea_type": task_data.get("idea_type", "creative")
+        }
         
-        result = await self.idea_coach.generate_ideas(
-            prompt=task_data.get("prompt", ""),
-            num_ideas=task_data.get("num_ideas", self.config["agents"]["num_ideas"]),
-            idea_type=task_data.get("idea_type", "creative")
-        )
+        workflow_steps = self.workflow_templates[context["workflow_type"]]
+        if not any(step["agent"] == "validator" for step in workflow_steps):
+            result = await self.idea_coach.generate_ideas(
+                **generation_args, idea_queue=task_data.get("idea_queue")
+            )
+        else:
+            # Start validating ideas as they stream in, so validation of the
+            # first ideas overlaps with generation of the rest
+            idea_queue = asyncio.Queue()
+            generation = asyncio.create_task(
+                self.idea_coach.generate_ideas(**generation_args, idea_queue=idea_queue)
+            )
+            ideas_to_validate = []
+            started = []
+            idea = None
+            while len(ideas_to_validate) < self.max_validations:
+                idea = await idea_queue.get()
+                if idea is None:
+                    break
+                ideas_to_validate.append(idea)
+                if not self.batch_validation:
+                    started.append(asyncio.create_task(self._validate_idea(idea, session)))
+            
+            if ideas_to_validate:
+                if self.batch_validation:
+                    validation = asyncio.create_task(
+                        self._validate_ideas(ideas_to_validate, session)
+                    )
+                else:
+                    validation = asyncio.gather(*started, return_exceptions=True)
+                context["early_validation"] = (ideas_to_validate, validation)
+            
+            if generation.done() or idea is None:
+                result = await generation
+            else:
+                # Enough ideas to validate: let the rest keep generating in
+                # the background and collect them once the workflow finishes
+                context["pending_generation"] = generation
+                result = {"success": True, "ideas": ideas_to_validate}
         
         # Store ideas in session for next steps
-        session["ideas"] = result.get("ideas", [])
+        session.ideas = result.get("ideas", [])
         
         return result
     
-    async def _execute_validation_step(self, context: Dict[str, Any], session: Dict[str, Any]) -> Dict[str, Any]:
+    async def _validate_ideas(self, ideas: List[Dict[str, Any]], session: Session) -> List[Any]:
+        """Validate ideas in one batched call, or concurrently one by one.
+        
+        Returns one validation result (or raised exception) per idea.
+        """
+        if self.batch_validation:
+            async with self._validation_semaphore:
+                return await self.validator.validate_ideas_batch(
+                    ideas, session_id=session.session_id
+                )
+        return await asyncio.gather(
+            *(self._validate_idea(idea, session) for idea in ideas),
+            return_exceptions=True
+        )
+    
+    async def _validate_idea(self, idea: Dict[str, Any], session: Session) -> Dict[str, Any]:
+        """Validate one idea, capping in-flight validations to respect provider rate limits"""
+        async with self._validation_semaphore:
+            return await self.validator.validate_idea(
+                idea=idea,
+                session_id=session.session_id
+            )
+    
+    async def _execute_validation_step(self, context: Dict[str, Any], session: Session) -> Dict[str, Any]:
         """Execute validation step"""
         # Get ideas from previous step or session
-        ideas = session.get("ideas", [])
+        ideas = session.ideas
         if not ideas:
             raise ValueError("No ideas available for validation")
         
-        validation_results = []
+        # Validate the top ideas, reusing any validation the generation step
+        # already started
+        early_validation = context.pop("early_validation", None)
+        if early_validation:
+            ideas_to_validate, validation = early_validation
+            outcomes = await validation
+        else:
+            ideas_to_validate = ideas[:self.max_validations]
+            outcomes = await self._validate_ideas(ideas_to_validate, session)
         
-        # Validate each idea (or top ideas based on config)
-        max_validations = min(len(ideas), 3)  # Limit validations
-        
-        for idea in ideas[:max_validations]:
-            validation_result = await self.validator.validate_idea(
-                idea=idea,
-                session_id=session["session_id"]
-            )
-            validation_results.append({
-                "idea": idea,
-                "validation": validation_result
-            })
+        validation_results = []
+        for idea, validation_result in zip(ideas_to_validate, outcomes):
+            if isinstance(validation_result, Exception):
+                validation_result = {"success": False, "error": str(validation_result)}
+            validation_results.append(ValidatedIdea(idea, validation_result))
         
         # Store validation results in session
-        session["validations"] = validation_results
+        session.validations = validation_results
         
         return {
-            "validated_ideas": validation_results,
+            "validated_ideas": [validated.to_dict() for validated in validation_results],
             "total_validated": len(validation_results)
         }
     
-    async def _execute_prd_creation_step(self, context: Dict[str, Any], session: Dict[str, Any]) -> Dict[str, Any]:
+    async def _execute_prd_creation_step(self, context: Dict[str, Any], session: Session) -> Dict[str, Any]:
         """Execute PRD creation step"""
         # Get top validated idea
-        validations = session.get("validations", [])
+        validations = session.validations
         if not validations:
             raise ValueError("No validated ideas available for PRD creation")
         
         # Select best idea based on validation score
-        best_idea_data = max(
-            validations,
-            key=lambda x: x.get("validation", {}).get("validation_results", {}).get("overall_score", 0)
-        )
-        
-        idea = best_idea_data["idea"]
-        validation_data = best_idea_data["validation"]["validation_results"]
+        best = max(validations, key=attrgetter("overall_score"))
         
         prd_result = await self.product_manager.create_prd(
-            idea=idea,
-            validation_data=validation_data,
-            session_id=session["session_id"]
+            idea=best.idea,
+            validation_data=best.validation["validation_results"],
+            session_id=session.session_id
         )
         
         # Store PRD in session
-        session["prd"] = prd_result
+        session.prd = prd_result
         
         return prd_result
     
-    async def _handle_human_interaction(self, step_result: Dict[str, Any], session: Dict[str, Any]):
+    async def _handle_human_interaction(self, step_result: Dict[str, Any], session: Session):
         """Handle human-in-the-loop interactions"""
         interaction = {
             "timestamp": datetime.now().isoformat(),
@@ -242,21 +366,92 @@ class OrchestratorAgent(BaseAgent):
             "status": "pending"
         }
         
-        session["human_interactions"].append(interaction)
+        session.human_interactions.append(interaction)
         
         # In a real implementation, this would pause execution
         # and wait for human input through the web interface
         pass
     
     async def generate_ideas(self, prompt: str, num_ideas: int = None, idea_type: str = "creative") -> Dict[str, Any]:
-        """Public method for idea generation workflow"""
+        """Public method for idea generation workflow.
+
+        The generated ideas are also returned flat under ``ideas``.
+        Successful runs are cached per idea count and type, so a repeated
+        prompt (or, with ``cache.semantic``, a near-identical one) returns
+        the earlier result and its session instead of generating again.
+        """
+        num_ideas = num_ideas or self.config["agents"]["num_ideas"]
         task_data = {
             "workflow_type": "idea_generation",
             "prompt": prompt,
-            "num_ideas": num_ideas or self.config["agents"]["num_ideas"],
+            "num_ideas": num_ideas,
             "idea_type": idea_type
         }
-        return await self.execute_task(task_data)
+        if self.cache is None:
+            return await self._generate_ideas(task_data)
+
+        scope = f"generate_ideas|{num_ideas}|{idea_type}"
+        cache_key = LLMCache.make_key(scope, prompt)
+        cached, embedding = await self._cache_lookup(scope, cache_key, prompt)
+        if cached is not None:
+            result = orjson.loads(cached)
+            self._revive_session(result, task_data)
+            return result
+
+        result = await self._generate_ideas(task_data)
+        if _workflow_succeeded(result):
+            self.cache.set(cache_key, scope, orjson.dumps(result).decode(), embedding)
+        return result
+    
+    def _revive_session(self, result: Dict[str, Any], task_data: Dict[str, Any]) -> None:
+        """Make sure the session of a cached result can still be followed
+        up: refresh it, or re-create it from the result if it has expired
+        or been evicted since"""
+        session = self.session_store.get(result["session_id"])
+        if session is not None:
+            self.session_store.put(session)
+            return
+        session = self._create_session(result["session_id"], task_data)
+        session.ideas = result["ideas"]
+        self._update_session(session, result["workflow_result"])
+    
+    async def _generate_ideas(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self.execute_task(task_data)
+        if result["success"]:
+            result["ideas"] = _workflow_ideas(result["workflow_result"])
+        return result
+    
+    async def stream_ideas(self, prompt: str, num_ideas: int = None,
+                           idea_type: str = "creative") -> AsyncIterator[Dict[str, Any]]:
+        """Idea generation workflow that yields ``{"idea": ...}`` for each
+        idea as soon as it is generated, then ``{"done": ...}`` with the
+        session id, or ``{"error": ...}`` if the workflow failed.
+
+        Streamed runs bypass the response cache.
+        """
+        idea_queue = asyncio.Queue()
+        workflow = asyncio.create_task(self.execute_task({
+            "workflow_type": "idea_generation",
+            "prompt": prompt,
+            "num_ideas": num_ideas or self.config["agents"]["num_ideas"],
+            "idea_type": idea_type,
+            "idea_queue": idea_queue
+        }))
+        # Ends the stream even if the workflow fails before generating
+        workflow.add_done_callback(lambda _: idea_queue.put_nowait(None))
+        try:
+            while (idea := await idea_queue.get()) is not None:
+                yield {"idea": idea}
+            result = await workflow
+        finally:
+            workflow.cancel()
+
+        if not _workflow_succeeded(result):
+            steps = result.get("workflow_result", {}).get("steps", [])
+            errors = [step.get("error") or step["result"].get("error") for step in steps]
+            yield {"error": result.get("error") or next(filter(None, errors), "Idea generation failed")}
+        else:
+            yield {"done": True, "session_id": result["session_id"]}
     
     async def full_pipeline(self, prompt: str, num_ideas: int = None, idea_type: str = "creative") -> Dict[str, Any]:
         """Public method for full pipeline workflow"""
@@ -270,11 +465,13 @@ class OrchestratorAgent(BaseAgent):
     
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session data"""
-        return self.active_sessions.get(session_id)
+        session = self.session_store.get(session_id)
+        return session.to_dict() if session is not None else None
     
     def list_sessions(self) -> List[Dict[str, Any]]:
         """List all active sessions"""
-        return list(self.active_sessions.values())
+        return [session.to_dict()
+                for session in self.session_store.list(self.session_store.max_sessions)]
     
     def get_agent_status_summary(self) -> Dict[str, Any]:
         """Get status summary of all agents"""
@@ -283,6 +480,6 @@ class OrchestratorAgent(BaseAgent):
             "idea_coach": self.idea_coach.get_status(),
             "validator": self.validator.get_status(),
             "product_manager": self.product_manager.get_status(),
-            "active_sessions": len(self.active_sessions),
+            "active_sessions": self.session_store.count(),
             "total_workflows_executed": self.performance_metrics["tasks_completed"]
         }
\ No newline at end of file
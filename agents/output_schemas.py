@@ -0,0 +1,28 @@
+from typing import Dict, Any
+
+# Building blocks for the structured-output schemas passed to
+# BaseAgent.get_ai_response / stream_ai_response as ``json_schema``
+
+TEXT = {"type": "string"}
+RATING = {"type": "integer", "description": "Rating from 1 to 10"}
+TEXT_LIST = {"type": "array", "items": {"type": "string"}}
+
+
+def strict_object(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON schema for an object with exactly ``properties``, all required"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+def array_of(items: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON schema for an array of ``items``"""
+    return {"type": "array", "items": items}
+
+
+def named_schema(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Wrap ``schema`` with the name providers use for the tool/response format"""
+    return {"name": name, "schema": schema}
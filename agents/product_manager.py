@@ -1,8 +1,162 @@
 import asyncio
-import json
-from typing import Dict, Any, List
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import Dict, Any, List, Literal, Optional
+import orjson
 from datetime import datetime, timedelta
-from .base_agent import BaseAgent
+from pydantic import BaseModel, ConfigDict, ValidationError
+from .base_agent import BaseAgent, JSONArrayItemParser
+from .output_schemas import named_schema
+
+# Static instructions for the AI-written sections, sent as the (cacheable)
+# system prompt; the user message carries only the product's fields
+_EXEC_SUMMARY_SYSTEM = """As a senior product manager, create an executive summary for the
+product in the user's message.
+
+Create a compelling executive summary including:
+1. Product Vision & Mission
+2. Market Opportunity
+3. Key Value Propositions
+4. Success Potential
+5. Resource Requirements Overview"""
+
+_FUNCTIONAL_REQUIREMENTS_SYSTEM = """As a product manager, define functional requirements for the
+product in the user's message.
+
+Create detailed functional requirements with:
+1. Core Features (Must-have)
+2. Enhanced Features (Should-have)
+3. Future Features (Could-have)
+4. User Stories for key features
+5. Acceptance Criteria"""
+
+# The user messages are f-strings: they compile once with the module and
+# format faster than string.Template or str.format_map, while the static
+# instructions above are shared by every instance as the system prompt
+
+
+def _exec_summary_request(idea: Dict[str, Any], validation_data: Dict[str, Any]) -> str:
+    """User message for the executive summary"""
+    return f"""Product: {idea.get('title', 'New Product')}
+Description: {idea.get('concept', 'No description')}
+Validation Score: {validation_data.get('overall_score', 'N/A')}
+Market Potential: {validation_data.get('market_analysis', {}).get('score', 'N/A')}"""
+
+
+def _functional_requirements_request(idea: Dict[str, Any]) -> str:
+    """User message for the functional requirements"""
+    return f"""Product: {idea.get('title', 'Product')}
+Description: {idea.get('concept', 'Description')}
+Key Features: {idea.get('key_features', [])}"""
+
+
+class ExecutiveSummary(BaseModel):
+    """AI-written executive summary section"""
+    model_config = ConfigDict(extra="forbid")
+
+    vision: str
+    mission: str
+    opportunity: str
+    value_propositions: List[str]
+    success_potential: str
+    resource_requirements: str
+
+
+class Feature(BaseModel):
+    """One prioritized feature of the functional requirements"""
+    model_config = ConfigDict(extra="forbid")
+
+    name: str
+    priority: Literal["Must-have", "Should-have", "Could-have"]
+    description: str
+
+
+class FunctionalRequirements(BaseModel):
+    """AI-written functional requirements section"""
+    model_config = ConfigDict(extra="forbid")
+
+    core_features: List[Feature]
+    enhanced_features: List[Feature]
+    future_features: List[Feature]
+    user_stories: List[str]
+    acceptance_criteria: List[str]
+
+
+# The models double as the structured-output schemas, so what the provider
+# is asked for and what is accepted back can't drift apart
+EXEC_SUMMARY_SCHEMA = named_schema(
+    "submit_executive_summary", ExecutiveSummary.model_json_schema()
+)
+FUNCTIONAL_REQUIREMENTS_SCHEMA = named_schema(
+    "submit_functional_requirements", FunctionalRequirements.model_json_schema()
+)
+
+_FUNCTIONAL_REQUIREMENTS_TEMPLATE = FunctionalRequirements(
+    core_features=[
+        Feature(name="Primary functionality", priority="Must-have", description="Core product capability"),
+        Feature(name="User interface", priority="Must-have", description="Intuitive user experience"),
+        Feature(name="Data management", priority="Must-have", description="Secure data handling")
+    ],
+    enhanced_features=[
+        Feature(name="Advanced analytics", priority="Should-have", description="Enhanced reporting"),
+        Feature(name="Integration capabilities", priority="Should-have", description="Third-party connections")
+    ],
+    future_features=[
+        Feature(name="AI enhancements", priority="Could-have", description="Machine learning features"),
+        Feature(name="Mobile optimization", priority="Could-have", description="Mobile-first experience")
+    ],
+    user_stories=[],
+    acceptance_criteria=[]
+)
+
+# Which functional-requirements list holds features of each priority
+_FEATURE_LISTS = {
+    "Must-have": "core_features",
+    "Should-have": "enhanced_features",
+    "Could-have": "future_features"
+}
+
+# (phase, start week, end week, deliverables) for the PRD timeline
+_PROJECT_PHASES = (
+    ("Discovery & Planning", 0, 4, ("Requirements finalization", "Technical architecture", "Design system")),
+    ("MVP Development", 4, 16, ("Core features", "Basic UI", "Testing framework")),
+    ("Beta Testing", 16, 20, ("User feedback", "Performance optimization", "Bug fixes")),
+    ("Launch Preparation", 20, 24, ("Marketing materials", "Support documentation", "Launch strategy"))
+)
+_PHASE_BOUNDARY_WEEKS = sorted({week for _, start, end, _ in _PROJECT_PHASES for week in (start, end)})
+
+# PRDs reference their source idea and validation by content hash instead
+# of embedding them; the blobs are kept once per process, least recently
+# used evicted beyond _APPENDIX_LIMIT
+_APPENDIX_LIMIT = 256
+_appendices: "OrderedDict[str, bytes]" = OrderedDict()
+_appendices_lock = threading.Lock()
+
+
+def store_appendix(idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a PRD's source data and return the reference that replaces it"""
+    blob = orjson.dumps({"original_idea": idea, "validation_data": validation_data})
+    key = hashlib.blake2b(blob, digest_size=16).hexdigest()
+    with _appendices_lock:
+        _appendices[key] = blob
+        _appendices.move_to_end(key)
+        while len(_appendices) > _APPENDIX_LIMIT:
+            _appendices.popitem(last=False)
+    return {"ref": key, "size": len(blob)}
+
+
+def get_appendix(key: str) -> Optional[bytes]:
+    """JSON of a stored appendix, or None if unknown or evicted"""
+    with _appendices_lock:
+        blob = _appendices.get(key)
+        if blob is not None:
+            _appendices.move_to_end(key)
+    return blob
+
 
 class ProductManagerAgent(BaseAgent):
     def __init__(self, config: Dict[str, Any]):
@@ -10,7 +164,7 @@ class ProductManagerAgent(BaseAgent):
         
     async def execute_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         self.update_status("processing", "Creating Product Requirements Document")
-        start_time = datetime.now()
+        start_ns = time.monotonic_ns()
         
         try:
             idea = task_data.get("idea", {})
@@ -22,8 +176,7 @@ class ProductManagerAgent(BaseAgent):
             # Create comprehensive PRD
             prd_document = await self._create_prd(idea, validation_data, requirements_focus)
             
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(True, response_time)
+            response_time = self.record_task_time(True, start_ns)
             self.update_status("completed", None)
             
             return {
@@ -34,8 +187,7 @@ class ProductManagerAgent(BaseAgent):
             }
             
         except Exception as e:
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(False, response_time)
+            response_time = self.record_task_time(False, start_ns)
             self.update_status("error", f"Error: {str(e)}")
             
             return {
@@ -48,91 +200,59 @@ class ProductManagerAgent(BaseAgent):
     async def _create_prd(self, idea: Dict[str, Any], validation_data: Dict[str, Any], focus_areas: List[str]) -> Dict[str, Any]:
         """Create comprehensive Product Requirements Document"""
         
-        # Executive Summary
-        executive_summary = await self._create_executive_summary(idea, validation_data)
-        
-        # Product Overview
-        product_overview = await self._create_product_overview(idea, validation_data)
-        
-        # Market Analysis & User Research
-        market_analysis = await self._create_market_analysis(idea, validation_data)
-        
-        # Functional Requirements
-        functional_requirements = await self._create_functional_requirements(idea, validation_data)
-        
-        # Technical Requirements
-        technical_requirements = await self._create_technical_requirements(idea, validation_data)
-        
-        # User Experience Requirements
-        ux_requirements = await self._create_ux_requirements(idea, validation_data)
-        
-        # Business Requirements
-        business_requirements = await self._create_business_requirements(idea, validation_data)
-        
-        # Project Timeline & Milestones
-        timeline = await self._create_timeline(idea, validation_data)
-        
-        # Success Metrics & KPIs
-        success_metrics = await self._create_success_metrics(idea, validation_data)
-        
-        # Risk Assessment & Mitigation
-        risk_assessment = await self._create_risk_assessment(idea, validation_data)
+        # Only the executive summary and functional requirements call the
+        # AI, so those two run concurrently; the rest are built from
+        # templates without going through the event loop
+        executive_summary, functional_requirements = await asyncio.gather(
+            self._create_executive_summary(idea, validation_data),
+            self._create_functional_requirements(idea, validation_data)
+        )
+        product_overview = self._create_product_overview(idea, validation_data)
         
         return {
-            "document_id": f"prd_{datetime.now().timestamp()}",
+            # Time-ordered, with a random suffix so PRDs created in the same
+            # instant still get distinct ids
+            "document_id": f"prd_{time.time_ns():x}_{secrets.token_hex(4)}",
             "created_by": self.agent_id,
             "creation_date": datetime.now().isoformat(),
-            "product_name": idea.get("title", "New Product"),
+            "product_name": product_overview["product_name"],
             "version": "1.0",
             "executive_summary": executive_summary,
             "product_overview": product_overview,
-            "market_analysis": market_analysis,
+            "market_analysis": self._create_market_analysis(idea, validation_data),
             "functional_requirements": functional_requirements,
-            "technical_requirements": technical_requirements,
-            "ux_requirements": ux_requirements,
-            "business_requirements": business_requirements,
-            "timeline": timeline,
-            "success_metrics": success_metrics,
-            "risk_assessment": risk_assessment,
-            "appendices": {
-                "validation_data": validation_data,
-                "original_idea": idea
-            }
+            "technical_requirements": self._create_technical_requirements(idea, validation_data),
+            "ux_requirements": self._create_ux_requirements(idea, validation_data),
+            "business_requirements": self._create_business_requirements(idea, validation_data),
+            "timeline": self._create_timeline(idea, validation_data),
+            "success_metrics": self._create_success_metrics(idea, validation_data),
+            "risk_assessment": self._create_risk_assessment(idea, validation_data),
+            "appendices": store_appendix(idea, validation_data)
         }
     
     async def _create_executive_summary(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create executive summary section"""
-        prompt = f"""
-        As a senior product manager, create an executive summary for this product:
-        
-        Product: {idea.get('title', 'New Product')}
-        Description: {idea.get('concept', 'No description')}
-        Validation Score: {validation_data.get('overall_score', 'N/A')}
-        Market Potential: {validation_data.get('market_analysis', {}).get('score', 'N/A')}
-        
-        Create a compelling executive summary including:
-        1. Product Vision & Mission
-        2. Market Opportunity
-        3. Key Value Propositions
-        4. Success Potential
-        5. Resource Requirements Overview
+        prompt = _exec_summary_request(idea, validation_data)
         
-        Format as JSON with structured sections.
-        """
-        
-        response = await self.get_ai_response(prompt)
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
+            response = await self.get_ai_response(
+                prompt, system=_EXEC_SUMMARY_SYSTEM,
+                json_schema=EXEC_SUMMARY_SCHEMA, max_tokens=1000
+            )
+            return ExecutiveSummary.model_validate(response).model_dump()
+        except Exception:
+            # A failed call or a response that doesn't match the schema falls
+            # back to a template so one section can't sink the whole PRD
             return {
                 "vision": f"Revolutionary {idea.get('title', 'product')} addressing market needs",
                 "mission": "Deliver exceptional value to target users",
                 "opportunity": "Significant market opportunity identified",
                 "value_propositions": ["Innovative solution", "Strong market fit", "Scalable approach"],
-                "success_potential": "High potential based on validation analysis"
+                "success_potential": "High potential based on validation analysis",
+                "resource_requirements": "Resource plan to be refined after discovery"
             }
     
-    async def _create_product_overview(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_product_overview(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create detailed product overview"""
         return {
             "product_name": idea.get("title", "New Product"),
@@ -149,7 +269,7 @@ class ProductManagerAgent(BaseAgent):
             "launch_readiness": validation_data.get("overall_score", 0) >= 7
         }
     
-    async def _create_market_analysis(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_market_analysis(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create market analysis section"""
         return {
             "target_market": {
@@ -168,44 +288,38 @@ class ProductManagerAgent(BaseAgent):
     
     async def _create_functional_requirements(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create functional requirements"""
-        prompt = f"""
-        As a product manager, define functional requirements for:
-        
-        Product: {idea.get('title', 'Product')}
-        Description: {idea.get('concept', 'Description')}
-        Key Features: {idea.get('key_features', [])}
-        
-        Create detailed functional requirements with:
-        1. Core Features (Must-have)
-        2. Enhanced Features (Should-have)
-        3. Future Features (Could-have)
-        4. User Stories for key features
-        5. Acceptance Criteria
-        
-        Format as JSON with priority levels and user stories.
-        """
+        prompt = _functional_requirements_request(idea)
         
-        response = await self.get_ai_response(prompt)
+        # This is the longest section, so it is streamed: features are parsed
+        # as they complete and survive a connection dropped mid-answer
+        parser = JSONArrayItemParser()
+        chunks = []
+        features = []
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {
-                "core_features": [
-                    {"name": "Primary functionality", "priority": "Must-have", "description": "Core product capability"},
-                    {"name": "User interface", "priority": "Must-have", "description": "Intuitive user experience"},
-                    {"name": "Data management", "priority": "Must-have", "description": "Secure data handling"}
-                ],
-                "enhanced_features": [
-                    {"name": "Advanced analytics", "priority": "Should-have", "description": "Enhanced reporting"},
-                    {"name": "Integration capabilities", "priority": "Should-have", "description": "Third-party connections"}
-                ],
-                "future_features": [
-                    {"name": "AI enhancements", "priority": "Could-have", "description": "Machine learning features"},
-                    {"name": "Mobile optimization", "priority": "Could-have", "description": "Mobile-first experience"}
-                ]
-            }
+            stream = self.stream_ai_response(
+                prompt, system=_FUNCTIONAL_REQUIREMENTS_SYSTEM,
+                json_schema=FUNCTIONAL_REQUIREMENTS_SCHEMA, max_tokens=3000
+            )
+            async with aclosing(stream):
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    features.extend(parser.feed(chunk))
+            return FunctionalRequirements.model_validate_json("".join(chunks)).model_dump()
+        except Exception:
+            requirements = {key: [] for key in _FEATURE_LISTS.values()}
+            for feature in features:
+                try:
+                    feature = Feature.model_validate(feature)
+                except ValidationError:
+                    continue
+                requirements[_FEATURE_LISTS[feature.priority]].append(feature.model_dump())
+            if any(requirements.values()):
+                return {**requirements, "user_stories": [], "acceptance_criteria": []}
+            # Nothing usable arrived; fall back to a template so one section
+            # can't sink the whole PRD
+            return _FUNCTIONAL_REQUIREMENTS_TEMPLATE.model_dump()
     
-    async def _create_technical_requirements(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_technical_requirements(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create technical requirements"""
         return {
             "architecture": {
@@ -238,7 +352,7 @@ class ProductManagerAgent(BaseAgent):
             ]
         }
     
-    async def _create_ux_requirements(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_ux_requirements(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create user experience requirements"""
         return {
             "design_principles": [
@@ -265,7 +379,7 @@ class ProductManagerAgent(BaseAgent):
             }
         }
     
-    async def _create_business_requirements(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_business_requirements(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create business requirements"""
         return {
             "business_objectives": [
@@ -292,40 +406,26 @@ class ProductManagerAgent(BaseAgent):
             ]
         }
     
-    async def _create_timeline(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_timeline(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create project timeline and milestones"""
         start_date = datetime.now()
+        # Each phase boundary is formatted once and shared by the phase that
+        # ends and the one that starts there
+        boundaries = {
+            week: (start_date + timedelta(weeks=week)).isoformat()
+            for week in _PHASE_BOUNDARY_WEEKS
+        }
         
         return {
             "project_phases": [
                 {
-                    "phase": "Discovery & Planning",
-                    "duration": "4 weeks",
-                    "start_date": start_date.isoformat(),
-                    "end_date": (start_date + timedelta(weeks=4)).isoformat(),
-                    "deliverables": ["Requirements finalization", "Technical architecture", "Design system"]
-                },
-                {
-                    "phase": "MVP Development",
-                    "duration": "12 weeks",
-                    "start_date": (start_date + timedelta(weeks=4)).isoformat(),
-                    "end_date": (start_date + timedelta(weeks=16)).isoformat(),
-                    "deliverables": ["Core features", "Basic UI", "Testing framework"]
-                },
-                {
-                    "phase": "Beta Testing",
-                    "duration": "4 weeks",
-                    "start_date": (start_date + timedelta(weeks=16)).isoformat(),
-                    "end_date": (start_date + timedelta(weeks=20)).isoformat(),
-                    "deliverables": ["User feedback", "Performance optimization", "Bug fixes"]
-                },
-                {
-                    "phase": "Launch Preparation",
-                    "duration": "4 weeks",
-                    "start_date": (start_date + timedelta(weeks=20)).isoformat(),
-                    "end_date": (start_date + timedelta(weeks=24)).isoformat(),
-                    "deliverables": ["Marketing materials", "Support documentation", "Launch strategy"]
+                    "phase": phase,
+                    "duration": f"{end - start} weeks",
+                    "start_date": boundaries[start],
+                    "end_date": boundaries[end],
+                    "deliverables": list(deliverables)
                 }
+                for phase, start, end, deliverables in _PROJECT_PHASES
             ],
             "critical_milestones": [
                 "Requirements sign-off",
@@ -342,7 +442,7 @@ class ProductManagerAgent(BaseAgent):
             }
         }
     
-    async def _create_success_metrics(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_success_metrics(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create success metrics and KPIs"""
         return {
             "key_metrics": {
@@ -371,7 +471,7 @@ class ProductManagerAgent(BaseAgent):
             }
         }
     
-    async def _create_risk_assessment(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_risk_assessment(self, idea: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create risk assessment and mitigation strategies"""
         return {
             "identified_risks": [
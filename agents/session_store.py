@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+import orjson
+from .types import Session
+
+
+class SessionStore:
+    """SQLite-backed session storage with TTL expiry and a size cap.
+
+    A file path lets several worker processes share sessions (the database
+    runs in WAL mode so readers don't block the writer); the default
+    ``":memory:"`` keeps them private to this process.
+    """
+
+    def __init__(self, path: str = ":memory:", ttl: float = 3600, max_sessions: int = 100):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Writes happen on the event loop; in WAL mode NORMAL skips the
+            # fsync on every commit and can only lose the latest commits
+            # on power loss, never corrupt the database
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, payload BLOB NOT NULL, updated_at INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+        )
+
+    def _cutoff(self) -> int:
+        return time.time_ns() - int(self.ttl * 1e9)
+
+    def put(self, session: Session) -> None:
+        """Insert or replace a session, marking it most recently used"""
+        payload = orjson.dumps(session.to_dict())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, payload, updated_at) VALUES (?, ?, ?)",
+                (session.session_id, payload, time.time_ns())
+            )
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, self._cutoff())
+            ).fetchone()
+        return Session.from_dict(orjson.loads(row[0])) if row else None
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def list(self, limit: int = None) -> List[Session]:
+        """Live sessions, least recently used first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM sessions WHERE updated_at >= ? "
+                "ORDER BY updated_at LIMIT ?",
+                (self._cutoff(), limit if limit is not None else -1)
+            ).fetchall()
+        return [Session.from_dict(orjson.loads(payload)) for payload, in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (self._cutoff(),)
+            ).fetchone()[0]
+
+    def prune(self) -> int:
+        """Delete expired sessions and the least recently used ones beyond
+        max_sessions; returns how many rows were removed"""
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (self._cutoff(),)
+            ).rowcount
+            evicted = self._conn.execute(
+                "DELETE FROM sessions WHERE id NOT IN "
+                "(SELECT id FROM sessions ORDER BY updated_at DESC LIMIT ?)",
+                (self.max_sessions,)
+            ).rowcount
+        return expired + evicted
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+
+# slots=True needs Python 3.10, the minimum listed in the README
+
+
+@dataclass(slots=True)
+class ValidatedIdea:
+    """An idea paired with the validator's result for it"""
+    idea: Dict[str, Any]
+    validation: Dict[str, Any]
+
+    @property
+    def overall_score(self) -> float:
+        """Overall validation score, 0 when validation failed"""
+        results = self.validation.get("validation_results")
+        return results.get("overall_score", 0) if results else 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for the API boundary"""
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class Session:
+    """Workflow execution state tracked by the orchestrator"""
+    session_id: str
+    initial_request: Dict[str, Any]
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    last_updated: str = field(default_factory=lambda: datetime.now().isoformat())
+    workflow_history: List[Dict[str, Any]] = field(default_factory=list)
+    current_stage: str = "initialized"
+    results: Dict[str, Any] = field(default_factory=dict)
+    human_interactions: List[Dict[str, Any]] = field(default_factory=list)
+    ideas: List[Dict[str, Any]] = field(default_factory=list)
+    validations: List[ValidatedIdea] = field(default_factory=list)
+    prd: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for the API boundary"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Session":
+        """Rebuild a session serialized with to_dict"""
+        validations = [ValidatedIdea(**validated) for validated in data.get("validations", [])]
+        return cls(**{**data, "validations": validations})
@@ -1,17 +1,113 @@
-import asyncio
-import json
-import aiohttp
+import time
+from bisect import bisect_right
 from typing import Dict, Any, List
 from datetime import datetime
 from .base_agent import BaseAgent
+from .output_schemas import TEXT, RATING, TEXT_LIST, array_of, named_schema, strict_object
+
+
+# The four analyses every validation covers. The instructions are sent as
+# the (cacheable) system prompt; the user message carries only idea fields
+_ANALYSIS_SECTIONS = """1. Market analysis: market size (TAM, SAM, SOM), trends, customer pain
+   points, market readiness, regulation and entry barriers. Rate market
+   viability from 1-10.
+2. Competitive analysis: direct and indirect competitors, advantages and
+   disadvantages, saturation, differentiation and likely competitive
+   responses. Rate competitive position from 1-10.
+3. Technical feasibility: complexity, resource requirements, technology
+   readiness, development timeline, scalability, integrations and risks.
+   Rate overall feasibility from 1-10.
+4. Financial analysis: revenue potential, startup investment, operating
+   costs, break-even, profitability, funding needs and ROI. Rate financial
+   attractiveness from 1-10."""
+
+_PANEL = """As a panel of market research, competitive intelligence, technical
+feasibility and financial experts"""
+
+_ANALYSIS_SYSTEM = f"""{_PANEL}, validate the idea in the user's message.
+
+Provide:
+{_ANALYSIS_SECTIONS}"""
+
+_BATCH_VALIDATION_SYSTEM = f"""{_PANEL}, validate each of the ideas in the user's message.
+
+For every idea provide:
+{_ANALYSIS_SECTIONS}
+
+Return one validation per idea, tagged with its idea number."""
+
+_ANALYSES = {
+    "market_analysis": strict_object({
+        "score": RATING, "analysis": TEXT, "key_insights": TEXT_LIST
+    }),
+    "competitive_analysis": strict_object({
+        "score": RATING, "competitors": TEXT_LIST,
+        "advantages": TEXT_LIST, "threats": TEXT_LIST
+    }),
+    "technical_feasibility": strict_object({
+        "score": RATING, "complexity": TEXT,
+        "timeline": TEXT, "risks": TEXT_LIST
+    }),
+    "financial_analysis": strict_object({
+        "score": RATING, "revenue_potential": TEXT,
+        "investment_needed": TEXT, "roi_timeline": TEXT
+    })
+}
+
+ANALYSIS_SCHEMA = named_schema("submit_analysis", strict_object(_ANALYSES))
+
+# One entry per idea, tagged with its number in the prompt
+BATCH_VALIDATION_SCHEMA = named_schema("submit_validations", strict_object({
+    "validations": array_of(strict_object({
+        "idea_number": {"type": "integer", "description": "Number of the idea being validated"},
+        **_ANALYSES
+    }))
+}))
+
+# Contribution of each analysis score to the overall validation score
+_SCORE_WEIGHTS = (
+    ("market", 0.3),
+    ("competition", 0.25),
+    ("technical", 0.25),
+    ("financial", 0.2)
+)
+
+# Overall score buckets: below 6, 6 up to 8, and 8 or more
+_OVERALL_THRESHOLDS = (6, 8)
+_OVERALL_RECOMMENDATIONS = (
+    "Significant challenges identified - consider pivoting or major modifications",
+    "Promising idea with some challenges - address key concerns before proceeding",
+    "Strong idea with high potential - recommend proceeding to development"
+)
+
+# Analyses scoring below _WEAK_SCORE get a recommendation of their own
+_WEAK_SCORE = 6
+_WEAK_AREA_RECOMMENDATIONS = (
+    ("market", "Conduct additional market research to validate demand"),
+    ("technical", "Assess technical risks and consider alternative implementation approaches"),
+    ("financial", "Review business model and explore additional revenue streams")
+)
+
+
+def _describe_idea(idea: Dict[str, Any]) -> str:
+    """The idea fields the analyses are based on"""
+    return f"""Title: {idea.get('title', 'Unknown')}
+Description: {idea.get('concept', 'No description')}
+Target Market: {idea.get('target_market', 'Unknown')}
+Technology Stack: {idea.get('technology_stack', 'Not specified')}
+Revenue Model: {idea.get('revenue_model', 'Not specified')}
+Startup Costs: {idea.get('startup_costs', 'Unknown')}"""
+
 
 class ValidationAgent(BaseAgent):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config, "validation")
+        # Response budget for one idea's four analyses
+        self.analysis_max_tokens = 1000
         
     async def execute_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         self.update_status("processing", "Validating idea")
-        start_time = datetime.now()
+        start_ns = time.monotonic_ns()
         
         try:
             idea = task_data.get("idea", {})
@@ -23,8 +119,7 @@ class ValidationAgent(BaseAgent):
             # Perform comprehensive validation
             validation_results = await self._comprehensive_validation(idea, validation_criteria)
             
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(True, response_time)
+            response_time = self.record_task_time(True, start_ns)
             self.update_status("completed", None)
             
             return {
@@ -35,8 +130,7 @@ class ValidationAgent(BaseAgent):
             }
             
         except Exception as e:
-            response_time = (datetime.now() - start_time).total_seconds()
-            self.update_metrics(False, response_time)
+            response_time = self.record_task_time(False, start_ns)
             self.update_status("error", f"Error: {str(e)}")
             
             return {
@@ -49,18 +143,16 @@ class ValidationAgent(BaseAgent):
     async def _comprehensive_validation(self, idea: Dict[str, Any], criteria: List[str]) -> Dict[str, Any]:
         """Perform comprehensive idea validation"""
         
-        # Market Analysis
-        market_analysis = await self._analyze_market(idea)
-        
-        # Competitive Analysis
-        competitive_analysis = await self._analyze_competition(idea)
-        
-        # Technical Feasibility
-        technical_feasibility = await self._assess_feasibility(idea)
-        
-        # Financial Potential
-        financial_analysis = await self._analyze_financials(idea)
+        analyses = await self._analyze_all(idea)
         
+        return self._compile_validation(
+            analyses["market_analysis"], analyses["competitive_analysis"],
+            analyses["technical_feasibility"], analyses["financial_analysis"]
+        )
+    
+    def _compile_validation(self, market_analysis: Dict[str, Any], competitive_analysis: Dict[str, Any],
+                            technical_feasibility: Dict[str, Any], financial_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Score the four analyses and assemble the validation results"""
         # Calculate overall validation score
         overall_score = self._calculate_validation_score({
             "market": market_analysis.get("score", 0),
@@ -84,177 +176,95 @@ class ValidationAgent(BaseAgent):
             "validation_timestamp": datetime.now().isoformat()
         }
     
-    async def _analyze_market(self, idea: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze market viability of the idea"""
-        prompt = f"""
-        As a market research expert, analyze the market viability for this idea:
-        
-        Idea: {idea.get('title', 'Unknown')}
-        Description: {idea.get('concept', 'No description')}
-        Target Market: {idea.get('target_market', 'Unknown')}
-        
-        Provide analysis on:
-        1. Market Size (TAM, SAM, SOM estimates)
-        2. Market Trends (growing/declining/stable)
-        3. Customer Pain Points addressed
-        4. Market Readiness (early/mainstream/late adopter)
-        5. Regulatory Environment
-        6. Market Entry Barriers
-        
-        Rate the market viability from 1-10 and explain your reasoning.
-        Format as JSON with 'score', 'analysis', and 'key_insights' fields.
-        """
-        
-        response = await self.get_ai_response(prompt)
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {
-                "score": 5,
-                "analysis": response,
-                "key_insights": ["Market analysis completed", "Further research recommended"]
-            }
-    
-    async def _analyze_competition(self, idea: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze competitive landscape"""
-        prompt = f"""
-        As a competitive intelligence analyst, analyze the competitive landscape for:
-        
-        Idea: {idea.get('title', 'Unknown')}
-        Description: {idea.get('concept', 'No description')}
-        
-        Analyze:
-        1. Direct Competitors (existing solutions)
-        2. Indirect Competitors (alternative approaches)
-        3. Competitive Advantages/Disadvantages
-        4. Market Saturation Level
-        5. Differentiation Opportunities
-        6. Competitive Response Likelihood
-        
-        Rate competitive position from 1-10 (10 = strong competitive position).
-        Format as JSON with 'score', 'competitors', 'advantages', 'threats' fields.
-        """
-        
-        response = await self.get_ai_response(prompt)
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {
-                "score": 6,
-                "competitors": ["Analysis in progress"],
-                "advantages": ["Unique approach identified"],
-                "threats": ["Competitive response expected"]
-            }
-    
-    async def _assess_feasibility(self, idea: Dict[str, Any]) -> Dict[str, Any]:
-        """Assess technical and operational feasibility"""
-        prompt = f"""
-        As a technical feasibility expert, assess the feasibility of implementing:
-        
-        Idea: {idea.get('title', 'Unknown')}
-        Description: {idea.get('concept', 'No description')}
-        Technology Stack: {idea.get('technology_stack', 'Not specified')}
-        
-        Evaluate:
-        1. Technical Complexity (1-10)
-        2. Resource Requirements (team size, skills)
-        3. Technology Readiness Level
-        4. Development Timeline estimates
-        5. Scalability Challenges
-        6. Integration Requirements
-        7. Risk Factors
-        
-        Rate overall feasibility from 1-10.
-        Format as JSON with 'score', 'complexity', 'timeline', 'risks' fields.
-        """
-        
-        response = await self.get_ai_response(prompt)
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {
-                "score": 7,
-                "complexity": "Medium",
-                "timeline": "6-12 months",
-                "risks": ["Technical challenges manageable"]
-            }
-    
-    async def _analyze_financials(self, idea: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze financial potential and requirements"""
-        prompt = f"""
-        As a financial analyst, evaluate the financial aspects of:
-        
-        Idea: {idea.get('title', 'Unknown')}
-        Description: {idea.get('concept', 'No description')}
-        Revenue Model: {idea.get('revenue_model', 'Not specified')}
-        Startup Costs: {idea.get('startup_costs', 'Unknown')}
-        
-        Analyze:
-        1. Revenue Potential (annual projections)
-        2. Startup Investment Required
-        3. Operating Costs Structure
-        4. Break-even Timeline
-        5. Profitability Potential
-        6. Funding Requirements
-        7. ROI Projections
-        
-        Rate financial attractiveness from 1-10.
-        Format as JSON with 'score', 'revenue_potential', 'investment_needed', 'roi_timeline' fields.
-        """
-        
-        response = await self.get_ai_response(prompt)
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {
-                "score": 6,
-                "revenue_potential": "Moderate",
-                "investment_needed": "Medium",
-                "roi_timeline": "2-3 years"
-            }
+    async def _analyze_all(self, idea: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the market, competitive, technical and financial analyses of
+        an idea in one structured AI call"""
+        return await self.get_ai_response(
+            _describe_idea(idea), system=_ANALYSIS_SYSTEM,
+            json_schema=ANALYSIS_SCHEMA, max_tokens=self.analysis_max_tokens
+        )
     
     def _calculate_validation_score(self, scores: Dict[str, float]) -> float:
         """Calculate weighted overall validation score"""
-        weights = {
-            "market": 0.3,
-            "competition": 0.25,
-            "technical": 0.25,
-            "financial": 0.2
-        }
-        
-        weighted_score = sum(scores.get(key, 0) * weight for key, weight in weights.items())
+        weighted_score = sum(scores.get(key, 0) * weight for key, weight in _SCORE_WEIGHTS)
         return round(weighted_score, 2)
     
     def _generate_recommendations(self, overall_score: float, analyses: Dict[str, Any]) -> List[str]:
         """Generate actionable recommendations based on validation results"""
-        recommendations = []
-        
-        if overall_score >= 8:
-            recommendations.append("Strong idea with high potential - recommend proceeding to development")
-        elif overall_score >= 6:
-            recommendations.append("Promising idea with some challenges - address key concerns before proceeding")
-        else:
-            recommendations.append("Significant challenges identified - consider pivoting or major modifications")
-        
-        # Add specific recommendations based on individual scores
-        market_score = analyses.get("market", {}).get("score", 0)
-        if market_score < 6:
-            recommendations.append("Conduct additional market research to validate demand")
-        
-        tech_score = analyses.get("technical", {}).get("score", 0)
-        if tech_score < 6:
-            recommendations.append("Assess technical risks and consider alternative implementation approaches")
+        recommendations = [_OVERALL_RECOMMENDATIONS[bisect_right(_OVERALL_THRESHOLDS, overall_score)]]
+        # Add specific recommendations for weak individual scores
+        recommendations.extend(
+            recommendation for area, recommendation in _WEAK_AREA_RECOMMENDATIONS
+            if analyses.get(area, {}).get("score", 0) < _WEAK_SCORE
+        )
+        return recommendations
+    
+    def _build_batch_prompt(self, ideas: List[Dict[str, Any]]) -> str:
+        """User message listing the ideas to validate, numbered from 1"""
+        return "\n\n".join(
+            f"Idea {number}:\n{_describe_idea(idea)}"
+            for number, idea in enumerate(ideas, start=1)
+        )
+    
+    async def validate_ideas_batch(self, ideas: List[Dict[str, Any]], session_id: str = None) -> List[Dict[str, Any]]:
+        """Validate several ideas with a single structured AI call.
         
-        financial_score = analyses.get("financial", {}).get("score", 0)
-        if financial_score < 6:
-            recommendations.append("Review business model and explore additional revenue streams")
+        Returns one result per idea, in order, shaped like validate_idea's.
+        """
+        self.update_status("processing", f"Validating {len(ideas)} ideas")
+        start_ns = time.monotonic_ns()
         
-        return recommendations
+        try:
+            response = await self.get_ai_response(
+                self._build_batch_prompt(ideas), system=_BATCH_VALIDATION_SYSTEM,
+                json_schema=BATCH_VALIDATION_SCHEMA,
+                max_tokens=min(self.analysis_max_tokens * len(ideas) + 200, self.max_tokens)
+            )
+            by_number = {entry["idea_number"]: entry for entry in response["validations"]}
+            
+            response_time = self.record_task_time(True, start_ns)
+            self.update_status("completed", None)
+            
+            results = []
+            for number in range(1, len(ideas) + 1):
+                entry = by_number.get(number)
+                if entry is None:
+                    results.append({
+                        "success": False,
+                        "error": "No validation returned for idea",
+                        "agent_id": self.agent_id,
+                        "processing_time": response_time
+                    })
+                    continue
+                results.append({
+                    "success": True,
+                    "validation_results": self._compile_validation(
+                        entry["market_analysis"], entry["competitive_analysis"],
+                        entry["technical_feasibility"], entry["financial_analysis"]
+                    ),
+                    "agent_id": self.agent_id,
+                    "processing_time": response_time
+                })
+            return results
+            
+        except Exception as e:
+            response_time = self.record_task_time(False, start_ns)
+            self.update_status("error", f"Error: {str(e)}")
+            
+            return [{
+                "success": False,
+                "error": str(e),
+                "agent_id": self.agent_id,
+                "processing_time": response_time
+            } for _ in ideas]
     
     async def validate_idea(self, idea: Dict[str, Any], session_id: str = None) -> Dict[str, Any]:
-        """Public method to validate an idea"""
+        """Public method to validate an idea; a repeat validation of the same
+        idea is answered from the cache"""
         task_data = {
             "idea": idea,
             "session_id": session_id
         }
-        return await self.execute_task(task_data)
\ No newline at end of file
+        return await self._run_cached(
+            "validate_idea", {"idea": idea}, lambda: self.execute_task(task_data)
+        )
\ No newline at end of file
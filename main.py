@@ -1,16 +1,24 @@
+import asyncio
+import functools
+import os
+import orjson
 import uvicorn
 import yaml
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Dict, Any, AsyncIterator
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from starlette.routing import Match, Mount
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 
 from agents.orchestrator import OrchestratorAgent
 from agents.idea_coach import IdeaCoachAgent
 from agents.validation import ValidationAgent
-from agents.product_manager import ProductManagerAgent
+from agents.product_manager import ProductManagerAgent, get_appendix
 from models.schemas import (
     IdeaRequest, IdeaResponse, ValidationRequest, PRDRequest
 )
@@ -18,23 +26,73 @@ from models.schemas import (
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="FreshAgentLab", version="1.0.0")
 
+# libyaml's C loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=None)
+def get_config(path: str = "config.yaml") -> Dict[str, Any]:
+    """Parse the config file once per process"""
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+
+def _create_agents(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the agents the endpoints use, keyed by their app.state name"""
+    return {
+        "orchestrator": OrchestratorAgent(config),
+        "idea_coach": IdeaCoachAgent(config),
+        "validator": ValidationAgent(config),
+        "product_manager": ProductManagerAgent(config)
+    }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parsing the config and building the agents (which opens the session
+    # database) is blocking I/O, so it runs off the event loop
+    config = await asyncio.to_thread(get_config)
+    agents = await asyncio.to_thread(_create_agents, config)
+    for name, agent in agents.items():
+        setattr(app.state, name, agent)
+    yield
+    # The agents share one pair of AI clients; release their pooled connections
+    await app.state.orchestrator.aclose()
+    app.state.orchestrator.session_store.close()
+
+
+# Responses are rendered with orjson, like the agents' own (de)serialization
+app = FastAPI(
+    title="FreshAgentLab", version="1.0.0", lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# The bundled frontend is served from this origin; CORS_ORIGINS lists any
+# others (comma separated). Without credentials or wildcards, browsers can
+# cache the preflight for max_age seconds
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=os.getenv("CORS_ORIGINS", "http://localhost:3000").split(","),
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type"],
+    max_age=86400,
 )
 
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
 
-orchestrator = OrchestratorAgent(config)
-idea_coach = IdeaCoachAgent(config)
-validator = ValidationAgent(config)
-product_manager = ProductManagerAgent(config)
+class _GZipExceptEventStreams(GZipMiddleware):
+    """Starlette's gzip stream is only flushed as its buffer fills, which
+    would hold server-sent events back, so those routes are sent as is"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+
+# PRDs and session payloads run to tens of KB of JSON
+app.add_middleware(_GZipExceptEventStreams, minimum_size=1024, compresslevel=5)
 
 
 @app.post("/api/generate-ideas", response_model=IdeaResponse)
@@ -45,43 +103,10 @@ async def generate_ideas(request: IdeaRequest):
         if request.context and "idea_type" in request.context:
             idea_type = request.context["idea_type"]
 
-        result = await orchestrator.generate_ideas(
+        result = await app.state.orchestrator.generate_ideas(
             request.prompt, request.num_ideas, idea_type
         )
 
-        # Extract the workflow result to get the actual ideas
-        if (
-            "workflow_result" in result
-            and "steps" in result["workflow_result"]
-        ):
-            for step in result["workflow_result"]["steps"]:
-                if step.get("agent") == "idea_coach" and "result" in step:
-                    step_result = step["result"]
-                    ideas = step_result.get("ideas", [])
-
-                    # Handle multiple levels of nesting
-                    if ideas and len(ideas) > 0:
-                        first_item = ideas[0]
-                        if isinstance(first_item, dict):
-                            # Check for different possible nested structures
-                            if "ideas" in first_item:
-                                actual_ideas = first_item["ideas"]
-                            elif "business_ideas" in first_item:
-                                actual_ideas = first_item["business_ideas"]
-                            elif "product_ideas" in first_item:
-                                actual_ideas = first_item["product_ideas"]
-                            else:
-                                actual_ideas = ideas
-                        else:
-                            actual_ideas = ideas
-                    else:
-                        actual_ideas = []
-
-                    return IdeaResponse(
-                        ideas=actual_ideas, session_id=result["session_id"]
-                    )
-
-        # Fallback if structure is different
         return IdeaResponse(
             ideas=result.get("ideas", []),
             session_id=result.get("session_id", "unknown")
@@ -91,10 +116,25 @@ async def generate_ideas(request: IdeaRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _server_sent_events(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for event in events:
+        yield b"data: " + orjson.dumps(event) + b"\n\n"
+
+
+@app.get("/api/generate-ideas/stream")
+async def stream_ideas(prompt: str, num_ideas: int = 5, idea_type: str = "creative"):
+    # GET with query parameters so the browser's EventSource can consume it
+    events = app.state.orchestrator.stream_ideas(prompt, num_ideas, idea_type)
+    return StreamingResponse(
+        _server_sent_events(events), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/api/validate-idea")
 async def validate_idea(request: ValidationRequest):
     try:
-        result = await validator.validate_idea(
+        result = await app.state.validator.validate_idea(
             request.idea, request.session_id
         )
         return result
@@ -105,7 +145,7 @@ async def validate_idea(request: ValidationRequest):
 @app.post("/api/create-prd")
 async def create_prd(request: PRDRequest):
     try:
-        result = await product_manager.create_prd(
+        result = await app.state.product_manager.create_prd(
             request.idea, request.validation_data, request.session_id
         )
         return result
@@ -113,25 +153,74 @@ async def create_prd(request: PRDRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/appendix/{key}")
+async def get_prd_appendix(key: str):
+    # The stored blob is already JSON, so it is sent without re-encoding
+    appendix = get_appendix(key)
+    if appendix is None:
+        raise HTTPException(status_code=404, detail="Appendix not found")
+    return Response(content=appendix, media_type="application/json")
+
+
+@app.get("/api/cache-stats")
+async def get_cache_stats():
+    return {
+        name: getattr(app.state, name).cache_stats()
+        for name in ("orchestrator", "idea_coach", "validator", "product_manager")
+    }
+
+
 @app.get("/api/status")
 async def get_status():
     return {
         "status": "running",
         "agents": {
-            "orchestrator": orchestrator.get_status(),
-            "idea_coach": idea_coach.get_status(),
-            "validator": validator.get_status(),
-            "product_manager": product_manager.get_status()
+            "orchestrator": app.state.orchestrator.get_status(),
+            "idea_coach": app.state.idea_coach.get_status(),
+            "validator": app.state.validator.get_status(),
+            "product_manager": app.state.product_manager.get_status()
         }
     }
 
 
-@app.get("/")
-async def serve_frontend():
-    return FileResponse("static/index.html")
+class _CachedStaticFiles(StaticFiles):
+    """Static files that browsers may reuse for five minutes; after that
+    they revalidate against the ETag and Last-Modified Starlette sends,
+    and unchanged files are answered with 304. The files aren't
+    fingerprinted, so they can't be cached for longer"""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=300, must-revalidate"
+        return response
+
+
+class _FrontendMount(Mount):
+    """Mount at "/" that leaves /api/ paths to the router, so unknown API
+    routes get a 404 and wrong methods a 405 instead of StaticFiles'
+    answers"""
+
+    def matches(self, scope):
+        if scope["type"] == "http" and scope["path"].startswith("/api/"):
+            return Match.NONE, {}
+        return super().matches(scope)
+
 
+# Mounted after the API routes so they take precedence; "/" serves index.html
 if Path("static").exists():
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.mount("/static", _CachedStaticFiles(directory="static"), name="static")
+    app.router.routes.append(
+        _FrontendMount("/", app=_CachedStaticFiles(directory="static", html=True), name="frontend")
+    )
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=config["app"]["host"], port=config["app"]["port"])
+    config = get_config()
+    # Workers need the app as an import string; uvicorn picks uvloop and
+    # httptools on its own when they are installed (uvicorn[standard])
+    uvicorn.run(
+        "main:app",
+        host=config["app"]["host"],
+        port=config["app"]["port"],
+        workers=int(os.getenv("WEB_CONCURRENCY", config["app"].get("workers", 1))),
+        log_level="info"
+    )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
@@ -10,7 +10,7 @@ class IdeaRequest(BaseModel):
 class IdeaResponse(BaseModel):
     ideas: List[Dict[str, Any]]
     session_id: str
-    timestamp: datetime = datetime.now()
+    timestamp: datetime = Field(default_factory=datetime.now)
 
 class ValidationRequest(BaseModel):
     idea: Dict[str, Any]
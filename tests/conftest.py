@@ -0,0 +1,60 @@
+import functools
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from agents.base_agent import _get_clients, _request_slots
+from agents.validation import ValidationAgent
+
+
+def build_agent(agent_class, client_classes=None, **config):
+    """``agent_class`` built from ``config`` (sections not given default to
+    an Anthropic-only ``models`` section) with API keys set and the SDK
+    client classes replaced by ``client_classes``' mocks"""
+    client_classes = client_classes or SimpleNamespace(anthropic=MagicMock(), openai=MagicMock())
+    config.setdefault("models", {
+        "default_provider": "anthropic",
+        "anthropic_model": "claude-3-5-sonnet-20241022"
+    })
+    with patch('agents.base_agent.load_dotenv'), \
+         patch('agents.base_agent.os.getenv') as mock_getenv, \
+         patch('agents.base_agent.anthropic.AsyncAnthropic', client_classes.anthropic), \
+         patch('agents.base_agent.openai.AsyncOpenAI', client_classes.openai):
+
+        mock_getenv.side_effect = lambda key: "test_key" if "API_KEY" in key else None
+
+        return agent_class(config)
+
+
+@pytest.fixture(autouse=True)
+def fresh_ai_clients():
+    """Drop the process-wide client pair and request limiter so each test's
+    patched AsyncAnthropic/AsyncOpenAI are the ones its agents get, and no
+    semaphore outlives the event loop of the test that used it"""
+    _get_clients.cache_clear()
+    _request_slots.cache_clear()
+    yield
+    _get_clients.cache_clear()
+    _request_slots.cache_clear()
+
+
+@pytest.fixture
+def sdk_client_classes():
+    """The mocks standing in for AsyncAnthropic and AsyncOpenAI when a
+    test's agents are built by make_agent"""
+    return SimpleNamespace(anthropic=MagicMock(), openai=MagicMock())
+
+
+@pytest.fixture
+def make_agent(sdk_client_classes):
+    """Factory for agents with mocked AI clients:
+    ``make_agent(IdeaCoachAgent, agents={...})``"""
+    return functools.partial(build_agent, client_classes=sdk_client_classes)
+
+
+@pytest.fixture(scope="module")
+def validation_agent():
+    """ValidationAgent shared by a module's tests, for tests of its
+    stateless scoring helpers; tests that mock its methods or rely on its
+    cache being empty define a function-scoped one instead"""
+    return build_agent(ValidationAgent)
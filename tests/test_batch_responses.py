@@ -0,0 +1,125 @@
+"""
+Test suite for BaseAgent.get_ai_responses_batch
+
+The provider batch APIs are mocked; polling is skipped by returning
+batches that have already finished.
+"""
+
+import pytest
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from agents.validation import ValidationAgent
+
+
+async def aiter_of(items):
+    for item in items:
+        yield item
+
+
+def anthropic_entry(custom_id, text=None):
+    """A batch result entry; entries without text have errored"""
+    if text is None:
+        return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type="errored"))
+    message = SimpleNamespace(content=[SimpleNamespace(text=text)])
+    return SimpleNamespace(custom_id=custom_id,
+                           result=SimpleNamespace(type="succeeded", message=message))
+
+
+class TestGetAIResponsesBatch:
+    """Realtime fallback, cache reuse and result mapping of batch requests"""
+
+    @pytest.fixture
+    def agent(self, make_agent):
+        agent = make_agent(
+            ValidationAgent,
+            agents={"batch_threshold": 3, "batch_poll_interval": 0},
+            models={
+                "default_provider": "anthropic",
+                "anthropic_model": "claude-3-5-sonnet-20241022",
+                "openai_model": "gpt-4o"
+            }
+        )
+        agent.anthropic_client = MagicMock()
+        agent.openai_client = MagicMock()
+        return agent
+
+    def mock_anthropic_batch(self, agent, entries):
+        batches = agent.anthropic_client.beta.messages.batches
+        batches.create = AsyncMock(return_value=SimpleNamespace(id="batch_1", processing_status="ended"))
+        batches.results = AsyncMock(return_value=aiter_of(entries))
+        return batches
+
+    @pytest.mark.asyncio
+    async def test_short_lists_are_sent_in_realtime(self, agent):
+        batches = self.mock_anthropic_batch(agent, [])
+        with patch.object(agent, '_request_completion',
+                          AsyncMock(side_effect=lambda prompt, *args: f"re: {prompt}")):
+            responses = await agent.get_ai_responses_batch(["a", "b"])
+
+        assert responses == ["re: a", "re: b"]
+        batches.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_results_keep_prompt_order_and_failures_are_none(self, agent):
+        batches = self.mock_anthropic_batch(agent, [
+            anthropic_entry("request-2", "C"),
+            anthropic_entry("request-1"),
+            anthropic_entry("request-0", "A")
+        ])
+
+        responses = await agent.get_ai_responses_batch(["a", "b", "c"])
+
+        assert responses == ["A", None, "C"]
+        assert batches.create.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_cached_prompts_are_left_out_of_the_batch(self, agent):
+        scope, key = agent._cache_key("b", "anthropic")
+        agent.cache.set(key, scope, "cached B")
+        batches = self.mock_anthropic_batch(agent, [
+            anthropic_entry("request-0", "A"),
+            anthropic_entry("request-2", "C")
+        ])
+
+        responses = await agent.get_ai_responses_batch(["a", "b", "c"])
+
+        assert responses == ["A", "cached B", "C"]
+        sent = [request["custom_id"] for request in batches.create.await_args.kwargs["requests"]]
+        assert sent == ["request-0", "request-2"]
+        # Batch results are cached for the next call
+        assert agent.cache.get(agent._cache_key("c", "anthropic")[1]) == "C"
+
+    @pytest.mark.asyncio
+    async def test_openai_batch_output_is_mapped_by_custom_id(self, agent):
+        def line(custom_id, status, text=None):
+            body = {"choices": [{"message": {"content": text}}]} if text else {}
+            return json.dumps({"custom_id": custom_id,
+                               "response": {"status_code": status, "body": body}})
+
+        client = agent.openai_client
+        client.files.create = AsyncMock(return_value=SimpleNamespace(id="file_1"))
+        client.batches.create = AsyncMock(return_value=SimpleNamespace(
+            id="batch_1", status="completed", output_file_id="file_2"
+        ))
+        client.files.content = AsyncMock(return_value=SimpleNamespace(text="\n".join([
+            line("request-1", 200, "B"),
+            line("request-2", 500),
+            line("request-0", 200, "A")
+        ])))
+
+        responses = await agent.get_ai_responses_batch(["a", "b", "c"], "openai")
+
+        assert responses == ["A", "B", None]
+
+
+    @pytest.mark.asyncio
+    async def test_aclose_closes_the_shared_clients(self, agent):
+        agent.anthropic_client.close = AsyncMock()
+        agent.openai_client.close = AsyncMock()
+
+        await agent.aclose()
+
+        agent.anthropic_client.close.assert_awaited_once()
+        agent.openai_client.close.assert_awaited_once()
@@ -0,0 +1,131 @@
+"""
+Test suite for RequestCoalescer and the idea coach's batched generation
+
+Covers how arrivals are grouped into batches and how one shared AI call
+is split back into per-request ideas.
+"""
+
+import pytest
+import asyncio
+from unittest.mock import AsyncMock
+
+from agents.coalescer import RequestCoalescer
+from agents.idea_coach import IdeaCoachAgent
+
+
+class TestRequestCoalescer:
+    """Batching by window, size and group, and error delivery"""
+
+    @pytest.mark.asyncio
+    async def test_requests_within_the_window_share_a_batch(self):
+        batches = []
+
+        async def run_batch(group, items):
+            batches.append((group, items))
+            return [item * 2 for item in items]
+
+        coalescer = RequestCoalescer(run_batch, window=0.01, max_batch=8)
+        results = await asyncio.gather(
+            coalescer.submit("a", 1), coalescer.submit("a", 2), coalescer.submit("b", 3)
+        )
+
+        assert results == [2, 4, 6]
+        assert sorted(batches) == [("a", [1, 2]), ("b", [3])]
+
+    @pytest.mark.asyncio
+    async def test_full_batch_runs_without_waiting_for_the_window(self):
+        run_batch = AsyncMock(side_effect=lambda group, items: items)
+        coalescer = RequestCoalescer(run_batch, window=60, max_batch=2)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(coalescer.submit("a", 1), coalescer.submit("a", 2)), timeout=1
+        )
+
+        assert results == [1, 2]
+        run_batch.assert_awaited_once_with("a", [1, 2])
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_only_their_submitters(self):
+        async def run_batch(group, items):
+            return [ValueError("no answer") if item == 2 else item for item in items]
+
+        coalescer = RequestCoalescer(run_batch, window=0.01)
+        results = await asyncio.gather(
+            coalescer.submit("a", 1), coalescer.submit("a", 2), return_exceptions=True
+        )
+
+        assert results[0] == 1
+        assert isinstance(results[1], ValueError)
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_fails_every_submitter(self):
+        run_batch = AsyncMock(side_effect=Exception("AI response error: down"))
+        coalescer = RequestCoalescer(run_batch, window=0.01)
+
+        results = await asyncio.gather(
+            coalescer.submit("a", 1), coalescer.submit("a", 2), return_exceptions=True
+        )
+
+        assert [str(result) for result in results] == ["AI response error: down"] * 2
+
+
+class TestBatchedIdeaGeneration:
+    """Concurrent generate_ideas calls sharing one AI call"""
+
+    @pytest.fixture
+    def idea_coach(self, make_agent):
+        return make_agent(IdeaCoachAgent, agents={"num_ideas": 2, "idea_batch_window": 0.01})
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_answered_by_request_number(self, idea_coach):
+        idea_coach.get_ai_response = AsyncMock(return_value={"requests": [
+            {"request_number": 2, "ideas": [{"title": "Dog walker"}]},
+            {"request_number": 1, "ideas": [{"title": "Cat cafe"}, {"title": "Cat toys"}]}
+        ]})
+
+        cats, dogs = await asyncio.gather(
+            idea_coach.generate_ideas("cats", 2), idea_coach.generate_ideas("dogs", 1)
+        )
+
+        assert [idea["title"] for idea in cats["ideas"]] == ["Cat cafe", "Cat toys"]
+        assert [idea["title"] for idea in dogs["ideas"]] == ["Dog walker"]
+        call = idea_coach.get_ai_response.await_args
+        assert call.kwargs["json_schema"]["name"] == "submit_creative_ideas_batch"
+        assert "Request 1:" in call.args[0] and "Request 2:" in call.args[0]
+
+    @pytest.mark.asyncio
+    async def test_request_missing_from_the_answer_fails_alone(self, idea_coach):
+        idea_coach.get_ai_response = AsyncMock(return_value={"requests": [
+            {"request_number": 1, "ideas": [{"title": "Cat cafe"}]}
+        ]})
+
+        cats, dogs = await asyncio.gather(
+            idea_coach.generate_ideas("cats", 1), idea_coach.generate_ideas("dogs", 1)
+        )
+
+        assert cats["success"] is True
+        assert dogs == {**dogs, "success": False, "error": "No ideas returned for request"}
+
+    @pytest.mark.asyncio
+    async def test_batches_are_split_to_fit_the_output_limit(self, idea_coach):
+        budgets = []
+
+        async def get_ai_response(prompt, **kwargs):
+            budgets.append(kwargs["max_tokens"])
+            if kwargs["json_schema"]["name"].endswith("_batch"):
+                return {"requests": [
+                    {"request_number": number, "ideas": [{"title": f"Batched {number}"}]}
+                    for number in (1, 2)
+                ]}
+            return {"ideas": [{"title": "Alone"}]}
+
+        idea_coach.get_ai_response = get_ai_response
+        # 12 ideas budget 3800 tokens each, so no two fit in 4000 together
+        results = await asyncio.gather(
+            idea_coach.generate_ideas("cats", 12), idea_coach.generate_ideas("dogs", 12),
+            idea_coach.generate_ideas("owls", 1), idea_coach.generate_ideas("bats", 1)
+        )
+
+        assert all(result["success"] for result in results)
+        assert sorted(budgets) == [1000, 3800, 3800]
+        assert all(budget <= idea_coach.max_tokens for budget in budgets)
@@ -0,0 +1,178 @@
+"""
+Test suite for the BaseAgent LLM response cache
+
+Covers the exact tier (SHA256 keyed lookups), TTL expiry, LRU eviction
+and the semantic tier's cosine-similarity matching.
+"""
+
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from agents.base_agent import _system_fingerprint
+from agents.cache import LLMCache
+from agents.validation import ValidationAgent
+
+
+class TestLLMCache:
+    """Unit tests for LLMCache"""
+
+    def test_exact_hit_returns_cached_response(self):
+        cache = LLMCache()
+        key = LLMCache.make_key("model|anthropic", "prompt")
+        cache.set(key, "model|anthropic", "response")
+
+        assert cache.get(key) == "response"
+
+    def test_key_depends_on_scope(self):
+        assert (LLMCache.make_key("a|anthropic", "prompt")
+                != LLMCache.make_key("a|openai", "prompt"))
+
+    def test_expired_entries_are_dropped(self):
+        cache = LLMCache(ttl=0)
+        key = LLMCache.make_key("scope", "prompt")
+        cache.set(key, "scope", "response")
+
+        assert cache.get(key) is None
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LLMCache(max_entries=2)
+        cache.set("a", "scope", "A")
+        cache.set("b", "scope", "B")
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", "scope", "C")
+
+        assert cache.get("a") == "A"
+        assert cache.get("b") is None
+        assert cache.get("c") == "C"
+
+    def test_semantic_hit_above_threshold(self):
+        cache = LLMCache(similarity_threshold=0.9)
+        cache.set("a", "scope", "A", [1.0, 0.0])
+
+        assert cache.get_similar("scope", [0.95, 0.312]) == "A"
+
+    def test_semantic_miss_below_threshold(self):
+        cache = LLMCache(similarity_threshold=0.9)
+        cache.set("a", "scope", "A", [1.0, 0.0])
+
+        assert cache.get_similar("scope", [0.6, 0.8]) is None
+
+    def test_stats_count_exact_and_semantic_hits(self):
+        cache = LLMCache(similarity_threshold=0.9)
+        cache.set("a", "scope", "A", [1.0, 0.0])
+        cache.get("a")
+        cache.get("b")
+        cache.get_similar("scope", [1.0, 0.0])
+
+        assert cache.stats() == {
+            "entries": 1, "hits": 1, "semantic_hits": 1, "misses": 1, "hit_rate": 1.0
+        }
+
+    def test_semantic_lookup_respects_scope(self):
+        cache = LLMCache()
+        cache.set("a", "gpt-4|openai", "A", [1.0, 0.0])
+
+        assert cache.get_similar("claude|anthropic", [1.0, 0.0]) is None
+
+
+class TestGetAIResponseCaching:
+    """Integration of the cache with BaseAgent.get_ai_response"""
+
+    @pytest.fixture
+    def agent(self, make_agent):
+        return make_agent(ValidationAgent)
+
+    @pytest.mark.asyncio
+    async def test_repeated_prompt_skips_provider_call(self, agent):
+        with patch.object(agent, '_request_completion',
+                          AsyncMock(return_value="response")) as mock_call:
+            first = await agent.get_ai_response("same prompt")
+            second = await agent.get_ai_response("same prompt")
+
+        assert first == second == "response"
+        assert mock_call.await_count == 1
+        assert agent.cache_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_can_be_disabled(self, agent):
+        agent.cache = None
+        with patch.object(agent, '_request_completion',
+                          AsyncMock(return_value="response")) as mock_call:
+            await agent.get_ai_response("same prompt")
+            await agent.get_ai_response("same prompt")
+
+        assert mock_call.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_json_schema_response_is_decoded_and_cached_per_schema(self, agent):
+        schema = {"name": "submit_ideas", "schema": {"type": "object"}}
+        with patch.object(agent, '_request_completion',
+                          AsyncMock(return_value='{"ideas": []}')) as mock_call:
+            structured = await agent.get_ai_response("same prompt", json_schema=schema)
+            plain = await agent.get_ai_response("same prompt")
+
+        assert structured == {"ideas": []}
+        assert plain == '{"ideas": []}'
+        assert mock_call.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_semantic_tier_compares_only_the_variable_prompt(self, agent):
+        # Toy embedding: word counts, so a long shared prefix dominates the
+        # vector of any text that includes it
+        def embed(model, input):
+            words = input.split()
+            vector = [words.count("shared"), words.count("cats"), words.count("dogs")]
+            return SimpleNamespace(data=[SimpleNamespace(embedding=vector)])
+
+        agent.semantic_cache = True
+        agent.openai_client.embeddings.create = AsyncMock(side_effect=embed)
+        prefix = "shared " * 50
+        with patch.object(agent, '_request_completion',
+                          AsyncMock(side_effect=["about cats", "about dogs"])):
+            cats = await agent.get_ai_response("ideas about cats", system=prefix)
+            dogs = await agent.get_ai_response("ideas about dogs", system=prefix)
+
+        assert (cats, dogs) == ("about cats", "about dogs")
+        embedded = [c.kwargs["input"] for c in agent.openai_client.embeddings.create.await_args_list]
+        assert embedded == ["ideas about cats", "ideas about dogs"]
+
+    @pytest.mark.asyncio
+    async def test_semantic_tier_is_scoped_by_system_prompt(self, agent):
+        agent.semantic_cache = True
+        agent._embed_prompt = AsyncMock(return_value=[1.0, 0.0])
+        with patch.object(agent, '_request_completion',
+                          AsyncMock(side_effect=["creative", "business"])) as mock_call:
+            await agent.get_ai_response("same prompt", system="creative template")
+            business = await agent.get_ai_response("same prompt", system="business template")
+
+        assert business == "business"
+        assert mock_call.await_count == 2
+
+    def test_system_prompt_is_hashed_once_and_scopes_the_key(self, agent):
+        _system_fingerprint.cache_clear()
+        creative = agent._cache_key("same prompt", "anthropic", system="creative template")
+        again = agent._cache_key("same prompt", "anthropic", system="creative template")
+        business = agent._cache_key("same prompt", "anthropic", system="business template")
+
+        assert creative == again
+        assert creative[0] != business[0] and creative[1] != business[1]
+        assert _system_fingerprint.cache_info().hits == 1
+
+    def test_max_tokens_defaults_to_config_and_accepts_estimates(self, agent):
+        assert agent._request_params("p", "anthropic")["max_tokens"] == 4000
+        assert agent._request_params("p", "anthropic", max_tokens=800)["max_tokens"] == 800
+
+    def test_system_prompt_is_sent_as_a_cacheable_prefix(self, agent):
+        agent.config["models"]["openai_model"] = "gpt-4o"
+        anthropic_params = agent._request_params("fields", "anthropic", system="instructions")
+        openai_params = agent._request_params("fields", "openai", system="instructions")
+
+        assert anthropic_params["system"] == [{
+            "type": "text", "text": "instructions", "cache_control": {"type": "ephemeral"}
+        }]
+        assert anthropic_params["messages"] == [{"role": "user", "content": "fields"}]
+        assert openai_params["messages"] == [
+            {"role": "system", "content": "instructions"},
+            {"role": "user", "content": "fields"}
+        ]
@@ -0,0 +1,236 @@
+"""
+Test suite for OrchestratorAgent session handling and step wiring
+"""
+
+import pytest
+import asyncio
+from unittest.mock import AsyncMock
+
+from agents.orchestrator import OrchestratorAgent
+from agents.types import ValidatedIdea
+
+
+def validated(title, score):
+    return ValidatedIdea(
+        {"title": title},
+        {"success": True, "validation_results": {"overall_score": score}}
+    )
+
+
+class TestOrchestrator:
+    """Session and PRD-step behaviour with the sub-agents mocked out"""
+
+    @pytest.fixture
+    def orchestrator(self, make_agent):
+        return make_agent(OrchestratorAgent, agents={"num_ideas": 3})
+
+    def test_sessions_are_exposed_as_dicts(self, orchestrator):
+        orchestrator._create_session("s1", {"prompt": "p"})
+
+        session = orchestrator.get_session("s1")
+        assert session["session_id"] == "s1"
+        assert session["initial_request"] == {"prompt": "p"}
+        assert session["current_stage"] == "initialized"
+
+    def test_oldest_session_is_evicted_past_max_sessions(self, orchestrator):
+        orchestrator.session_store.max_sessions = 3
+        sessions = [orchestrator._create_session(session_id, {})
+                    for session_id in ("s1", "s2", "s3")]
+        # Touching s1 makes s2 the least recently used session
+        orchestrator._update_session(sessions[0], {"steps": []})
+        orchestrator._create_session("s4", {})
+
+        assert orchestrator.get_session("s2") is None
+        assert [s["session_id"] for s in orchestrator.list_sessions()] == ["s3", "s1", "s4"]
+        assert orchestrator.get_session("s1")["current_stage"] == "completed"
+
+    def test_failed_validation_scores_zero(self):
+        assert ValidatedIdea({}, {"success": False, "error": "boom"}).overall_score == 0
+
+    @pytest.mark.asyncio
+    async def test_prd_step_uses_best_validated_idea(self, orchestrator):
+        session = orchestrator._create_session("s1", {})
+        session.validations = [validated("low", 4.0), validated("high", 8.5),
+                               validated("mid", 6.0)]
+        orchestrator.product_manager.create_prd = AsyncMock(return_value={"success": True})
+
+        await orchestrator._execute_prd_creation_step({}, session)
+
+        kwargs = orchestrator.product_manager.create_prd.await_args.kwargs
+        assert kwargs["idea"] == {"title": "high"}
+        assert kwargs["validation_data"] == {"overall_score": 8.5}
+        assert session.prd == {"success": True}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("batch_validation", [True, False])
+    async def test_remaining_ideas_generate_while_validation_runs(self, orchestrator, batch_validation):
+        orchestrator.batch_validation = batch_validation
+        release_rest = asyncio.Event()
+
+        async def generate_ideas(prompt, num_ideas, idea_type, idea_queue=None):
+            ideas = [{"id": f"idea_{i}"} for i in range(num_ideas)]
+            for idea in ideas[:3]:
+                await idea_queue.put(idea)
+            # Held back until validation has finished
+            await release_rest.wait()
+            for idea in ideas[3:]:
+                await idea_queue.put(idea)
+            await idea_queue.put(None)
+            return {"success": True, "ideas": ideas}
+
+        async def validate_idea(idea, session_id):
+            return {"success": True, "validation_results": {"overall_score": 5}}
+
+        async def validate_ideas_batch(ideas, session_id):
+            return [await validate_idea(idea, session_id) for idea in ideas]
+
+        async def create_prd(idea, validation_data, session_id):
+            release_rest.set()
+            return {"success": True}
+
+        orchestrator.idea_coach.generate_ideas = generate_ideas
+        orchestrator.validator.validate_idea = validate_idea
+        orchestrator.validator.validate_ideas_batch = validate_ideas_batch
+        orchestrator.product_manager.create_prd = create_prd
+
+        result = await orchestrator.full_pipeline("prompt", num_ideas=5)
+
+        steps = result["workflow_result"]["steps"]
+        assert [step["status"] for step in steps] == ["completed"] * 3
+        assert len(steps[0]["result"]["ideas"]) == 5
+        assert steps[1]["result"]["total_validated"] == 3
+        assert len(orchestrator.get_session(result["session_id"])["ideas"]) == 5
+
+    @pytest.mark.asyncio
+    async def test_unknown_step_agent_fails_the_step(self, orchestrator):
+        session = orchestrator._create_session("s1", {})
+
+        step_result = await orchestrator._execute_workflow_step(
+            {"agent": "marketer", "task": "plan"}, {}, session, 0
+        )
+
+        assert step_result["status"] == "failed"
+        assert step_result["error"] == "Unknown agent: marketer"
+
+    @pytest.mark.asyncio
+    async def test_late_generation_failure_keeps_the_early_ideas(self, orchestrator):
+        async def generate_ideas(prompt, num_ideas, idea_type, idea_queue=None):
+            for i in range(3):
+                await idea_queue.put({"id": f"idea_{i}"})
+            await asyncio.sleep(0)
+            await idea_queue.put(None)
+            return {"success": False, "error": "stream dropped"}
+
+        async def validate_ideas_batch(ideas, session_id):
+            return [{"success": True, "validation_results": {"overall_score": 5}} for _ in ideas]
+
+        orchestrator.idea_coach.generate_ideas = generate_ideas
+        orchestrator.validator.validate_ideas_batch = validate_ideas_batch
+        orchestrator.product_manager.create_prd = AsyncMock(return_value={"success": True})
+
+        result = await orchestrator.full_pipeline("prompt", num_ideas=5)
+
+        idea_step = result["workflow_result"]["steps"][0]
+        assert idea_step["status"] == "completed"
+        assert len(idea_step["result"]["ideas"]) == 3
+        assert idea_step["result"]["generation_error"] == "stream dropped"
+        assert len(orchestrator.get_session(result["session_id"])["ideas"]) == 3
+
+    @pytest.mark.asyncio
+    async def test_repeated_idea_requests_are_served_from_cache(self, orchestrator):
+        ideas = {"success": True, "ideas": [{"title": "Tool"}]}
+        orchestrator.idea_coach.generate_ideas = AsyncMock(return_value=ideas)
+
+        first = await orchestrator.generate_ideas("tools for cooks", 3)
+        again = await orchestrator.generate_ideas("tools for cooks", 3)
+        other_count = await orchestrator.generate_ideas("tools for cooks", 2)
+
+        assert again == first
+        assert other_count["session_id"] != first["session_id"]
+        assert orchestrator.idea_coach.generate_ideas.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_generated_ideas_are_returned_flat(self, orchestrator):
+        orchestrator.idea_coach.generate_ideas = AsyncMock(return_value={
+            "success": True, "ideas": [{"business_ideas": [{"title": "Tool"}]}]
+        })
+
+        result = await orchestrator.generate_ideas("tools for cooks", 3)
+
+        assert result["ideas"] == [{"title": "Tool"}]
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_restores_an_expired_session(self, orchestrator):
+        orchestrator.idea_coach.generate_ideas = AsyncMock(
+            return_value={"success": True, "ideas": [{"title": "Tool"}]}
+        )
+
+        first = await orchestrator.generate_ideas("tools for cooks", 3)
+        orchestrator.session_store.delete(first["session_id"])
+        again = await orchestrator.generate_ideas("tools for cooks", 3)
+
+        session = orchestrator.get_session(again["session_id"])
+        assert again["session_id"] == first["session_id"]
+        assert session["ideas"] == [{"title": "Tool"}]
+        assert session["current_stage"] == "completed"
+        assert orchestrator.idea_coach.generate_ideas.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_idea_requests_are_not_cached(self, orchestrator):
+        orchestrator.idea_coach.generate_ideas = AsyncMock(
+            return_value={"success": False, "error": "AI response error: overloaded"}
+        )
+
+        await orchestrator.generate_ideas("tools for cooks", 3)
+        await orchestrator.generate_ideas("tools for cooks", 3)
+
+        assert orchestrator.idea_coach.generate_ideas.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_similar_idea_requests_hit_the_semantic_cache(self, orchestrator):
+        orchestrator.semantic_cache = True
+        orchestrator._embed_prompt = AsyncMock(return_value=[1.0, 0.0])
+        orchestrator.idea_coach.generate_ideas = AsyncMock(
+            return_value={"success": True, "ideas": [{"title": "Tool"}]}
+        )
+
+        first = await orchestrator.generate_ideas("tools for cooks", 3)
+        similar = await orchestrator.generate_ideas("tools for chefs", 3)
+
+        assert similar["session_id"] == first["session_id"]
+        assert orchestrator.idea_coach.generate_ideas.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_streamed_ideas_arrive_before_the_workflow_ends(self, orchestrator):
+        release = asyncio.Event()
+
+        async def generate_ideas(prompt, num_ideas, idea_type, idea_queue=None):
+            ideas = [{"title": "Tool"}, {"title": "Gadget"}]
+            idea_queue.put_nowait(ideas[0])
+            await release.wait()
+            idea_queue.put_nowait(ideas[1])
+            idea_queue.put_nowait(None)
+            return {"success": True, "ideas": ideas}
+
+        orchestrator.idea_coach.generate_ideas = generate_ideas
+        events = orchestrator.stream_ideas("tools for cooks", 2)
+
+        assert await events.__anext__() == {"idea": {"title": "Tool"}}
+        release.set()
+        rest = [event async for event in events]
+
+        assert rest[0] == {"idea": {"title": "Gadget"}}
+        assert rest[1]["done"] is True
+        session = orchestrator.get_session(rest[1]["session_id"])
+        assert "idea_queue" not in session["initial_request"]
+        assert len(session["ideas"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_stream_ends_with_the_error(self, orchestrator):
+        orchestrator.idea_coach.generate_ideas = AsyncMock(
+            return_value={"success": False, "error": "AI response error: overloaded"}
+        )
+
+        events = [event async for event in orchestrator.stream_ideas("tools for cooks", 2)]
+
+        assert events == [{"error": "AI response error: overloaded"}]
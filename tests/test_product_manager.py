@@ -0,0 +1,170 @@
+"""
+Test suite for ProductManagerAgent PRD assembly
+"""
+
+import pytest
+import asyncio
+import json
+
+from agents.product_manager import ProductManagerAgent, get_appendix
+
+SUMMARY = {
+    "vision": "Tools for everyone",
+    "mission": "Ship it",
+    "opportunity": "Large",
+    "value_propositions": ["Fast"],
+    "success_potential": "High",
+    "resource_requirements": "Small team"
+}
+
+REQUIREMENTS = {
+    "core_features": [{"name": "Search", "priority": "Must-have", "description": "Find items"}],
+    "enhanced_features": [],
+    "future_features": [],
+    "user_stories": ["As a user I can search"],
+    "acceptance_criteria": ["Results in under a second"]
+}
+
+
+class TestCreatePRD:
+    """Concurrent section generation and per-section fallbacks"""
+
+    @pytest.fixture
+    def agent(self, make_agent):
+        return make_agent(ProductManagerAgent)
+
+    @pytest.mark.asyncio
+    async def test_ai_sections_are_requested_concurrently(self, agent):
+        in_flight = []
+        both_started = asyncio.Event()
+
+        async def wait_for_both(prompt):
+            in_flight.append(prompt)
+            if len(in_flight) == 2:
+                both_started.set()
+            # Would deadlock if the sections were awaited one at a time
+            await asyncio.wait_for(both_started.wait(), timeout=1)
+
+        async def get_ai_response(prompt, **kwargs):
+            await wait_for_both(prompt)
+            return SUMMARY
+
+        async def stream_ai_response(prompt, **kwargs):
+            await wait_for_both(prompt)
+            yield json.dumps(REQUIREMENTS)
+
+        agent.get_ai_response = get_ai_response
+        agent.stream_ai_response = stream_ai_response
+        prd = await agent._create_prd({"title": "Tool"}, {"overall_score": 7}, [])
+
+        assert prd["executive_summary"] == SUMMARY
+        assert prd["functional_requirements"] == REQUIREMENTS
+
+    @pytest.mark.asyncio
+    async def test_ai_sections_request_structured_output(self, agent):
+        schemas = []
+
+        async def get_ai_response(prompt, **kwargs):
+            schemas.append(kwargs["json_schema"]["name"])
+            return {"section": "ok"}
+
+        async def stream_ai_response(prompt, **kwargs):
+            schemas.append(kwargs["json_schema"]["name"])
+            yield '{"section": "ok"}'
+
+        agent.get_ai_response = get_ai_response
+        agent.stream_ai_response = stream_ai_response
+        await agent._create_prd({"title": "Tool"}, {"overall_score": 7}, [])
+
+        assert sorted(schemas) == ["submit_executive_summary", "submit_functional_requirements"]
+
+    @pytest.mark.asyncio
+    async def test_document_ids_are_unique(self, agent):
+        async def get_ai_response(prompt, **kwargs):
+            return {"section": "ok"}
+
+        async def stream_ai_response(prompt, **kwargs):
+            yield '{"section": "ok"}'
+
+        agent.get_ai_response = get_ai_response
+        agent.stream_ai_response = stream_ai_response
+        prds = await asyncio.gather(*(
+            agent._create_prd({"title": "Tool"}, {"overall_score": 7}, []) for _ in range(20)
+        ))
+
+        assert len({prd["document_id"] for prd in prds}) == 20
+        assert all(prd["document_id"].startswith("prd_") for prd in prds)
+
+    @pytest.mark.asyncio
+    async def test_appendix_is_stored_by_reference(self, agent):
+        async def get_ai_response(prompt, **kwargs):
+            return SUMMARY
+
+        async def stream_ai_response(prompt, **kwargs):
+            yield json.dumps(REQUIREMENTS)
+
+        agent.get_ai_response = get_ai_response
+        agent.stream_ai_response = stream_ai_response
+        idea, validation = {"title": "Tool"}, {"overall_score": 7}
+        first = await agent._create_prd(idea, validation, [])
+        second = await agent._create_prd(idea, validation, [])
+
+        ref = first["appendices"]["ref"]
+        assert second["appendices"]["ref"] == ref
+        assert json.loads(get_appendix(ref)) == {"original_idea": idea, "validation_data": validation}
+        assert get_appendix("unknown") is None
+
+    @pytest.mark.asyncio
+    async def test_failed_ai_section_falls_back_without_aborting(self, agent):
+        async def get_ai_response(prompt, **kwargs):
+            raise Exception("AI response error: overloaded")
+
+        async def stream_ai_response(prompt, **kwargs):
+            yield json.dumps(REQUIREMENTS)
+
+        agent.get_ai_response = get_ai_response
+        agent.stream_ai_response = stream_ai_response
+        result = await agent.create_prd({"title": "Tool"}, {"overall_score": 7}, "s1")
+
+        assert result["success"] is True
+        summary = result["prd_document"]["executive_summary"]
+        assert summary["vision"] == "Revolutionary Tool addressing market needs"
+        assert result["prd_document"]["functional_requirements"] == REQUIREMENTS
+
+    @pytest.mark.asyncio
+    async def test_off_schema_sections_fall_back_to_templates(self, agent):
+        async def get_ai_response(prompt, **kwargs):
+            return {"vision": "Missing the other fields"}
+
+        async def stream_ai_response(prompt, **kwargs):
+            yield '{"core_features": [{"name": "Search", "priority": "Urgent"}]}'
+
+        agent.get_ai_response = get_ai_response
+        agent.stream_ai_response = stream_ai_response
+        prd = await agent._create_prd({"title": "Tool"}, {"overall_score": 7}, [])
+
+        assert prd["executive_summary"]["vision"] == "Revolutionary Tool addressing market needs"
+        assert prd["functional_requirements"]["core_features"][0]["name"] == "Primary functionality"
+
+    @pytest.mark.asyncio
+    async def test_dropped_stream_keeps_completed_features(self, agent):
+        async def stream_ai_response(prompt, **kwargs):
+            yield '{"core_features": [{"name": "Search", "priority": "Must-have", "description": "Find items"}, '
+            yield '{"name": "Export", "priority": "Could-have", "description": "CS'
+            raise Exception("AI response error: connection reset")
+
+        agent.stream_ai_response = stream_ai_response
+        requirements = await agent._create_functional_requirements({"title": "Tool"}, {})
+
+        assert requirements["core_features"] == [
+            {"name": "Search", "priority": "Must-have", "description": "Find items"}
+        ]
+        assert requirements["future_features"] == []
+
+    def test_timeline_phases_are_contiguous(self, agent):
+        timeline = agent._create_timeline({"title": "Tool"}, {})
+        phases = timeline["project_phases"]
+
+        assert [phase["duration"] for phase in phases] == ["4 weeks", "12 weeks", "4 weeks", "4 weeks"]
+        for previous, following in zip(phases, phases[1:]):
+            assert previous["end_date"] == following["start_date"]
@@ -0,0 +1,71 @@
+"""
+Test suite for the limits BaseAgent puts on provider requests
+
+The SDK clients are mocked; retries themselves are left to the SDKs, so
+only the configured retry count is checked.
+"""
+
+import pytest
+import asyncio
+from types import SimpleNamespace
+
+from agents.validation import ValidationAgent
+
+
+class TestRequestLimits:
+    """Retry configuration and the shared in-flight request cap"""
+
+    @pytest.fixture
+    def config(self):
+        return {
+            "cache": {"enabled": False},
+            "models": {
+                "default_provider": "anthropic",
+                "anthropic_model": "claude-3-5-sonnet-20241022",
+                "max_retries": 4,
+                "max_concurrent_requests": 2
+            }
+        }
+
+    @pytest.fixture
+    def make_validator(self, make_agent, config):
+        return lambda: make_agent(ValidationAgent, **config)
+
+    def test_clients_are_created_with_configured_retries(self, make_validator, sdk_client_classes):
+        make_validator()
+
+        assert sdk_client_classes.anthropic.call_args.kwargs["max_retries"] == 4
+        assert sdk_client_classes.openai.call_args.kwargs["max_retries"] == 4
+
+    def test_clients_share_one_connection_pool(self, make_validator, sdk_client_classes):
+        make_validator()
+
+        http_client = sdk_client_classes.anthropic.call_args.kwargs["http_client"]
+        assert sdk_client_classes.openai.call_args.kwargs["http_client"] is http_client
+        assert http_client._transport._pool._max_connections == 2
+
+    @pytest.mark.asyncio
+    async def test_in_flight_requests_are_capped_across_agents(self, make_validator):
+        first = make_validator()
+        second = make_validator()
+        in_flight = 0
+        peak = 0
+
+        async def create(**params):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return SimpleNamespace(content=[SimpleNamespace(text="ok")])
+
+        first.anthropic_client.messages.create = create
+        assert second.anthropic_client is first.anthropic_client
+
+        responses = await asyncio.gather(*(
+            agent.get_ai_response(f"prompt {i}")
+            for i, agent in enumerate([first, second] * 3)
+        ))
+
+        assert responses == ["ok"] * 6
+        assert peak == 2
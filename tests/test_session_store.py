@@ -0,0 +1,50 @@
+"""
+Test suite for the SQLite session store
+"""
+
+from agents.session_store import SessionStore
+from agents.types import Session, ValidatedIdea
+
+
+class TestSessionStore:
+    """Persistence, expiry and eviction of sessions"""
+
+    def test_sessions_round_trip_with_validations(self):
+        store = SessionStore()
+        session = Session(session_id="s1", initial_request={"prompt": "p"})
+        session.validations = [ValidatedIdea({"title": "A"}, {"validation_results": {"overall_score": 7}})]
+        store.put(session)
+
+        loaded = store.get("s1")
+
+        assert loaded == session
+        assert loaded.validations[0].overall_score == 7
+
+    def test_expired_sessions_are_hidden_and_pruned(self):
+        store = SessionStore(ttl=0)
+        store.put(Session(session_id="s1", initial_request={}))
+
+        assert store.get("s1") is None
+        assert store.count() == 0
+        assert store.prune() == 1
+
+    def test_prune_evicts_least_recently_used_beyond_cap(self):
+        store = SessionStore(max_sessions=2)
+        for session_id in ("s1", "s2", "s3"):
+            store.put(Session(session_id=session_id, initial_request={}))
+
+        assert store.prune() == 1
+        assert [session.session_id for session in store.list()] == ["s2", "s3"]
+
+    def test_file_database_uses_wal_and_is_shared(self, tmp_path):
+        path = str(tmp_path / "sessions.db")
+        writer = SessionStore(path)
+        writer.put(Session(session_id="s1", initial_request={}))
+
+        reader = SessionStore(path)
+
+        assert reader.get("s1").session_id == "s1"
+        assert writer._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert writer._conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        writer.close()
+        reader.close()
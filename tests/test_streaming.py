@@ -0,0 +1,157 @@
+"""
+Test suite for streamed completions
+
+Covers JSONArrayItemParser, which pulls ideas out of a partial JSON
+document, and BaseAgent.stream_ai_response's chunking and caching.
+"""
+
+import pytest
+import json
+import random
+from contextlib import aclosing
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from agents.base_agent import JSONArrayItemParser
+from agents.idea_coach import IdeaCoachAgent
+from agents.validation import ValidationAgent
+
+
+def feed_in_chunks(text, sizes):
+    """Feed ``text`` to a fresh parser in chunks of the given sizes"""
+    parser = JSONArrayItemParser()
+    items, pos = [], 0
+    for size in sizes:
+        items.extend(parser.feed(text[pos:pos + size]))
+        pos += size
+    items.extend(parser.feed(text[pos:]))
+    return items
+
+
+class TestJSONArrayItemParser:
+    """Incremental extraction of array elements"""
+
+    def test_items_are_emitted_as_soon_as_they_close(self):
+        parser = JSONArrayItemParser()
+
+        assert parser.feed('{"ideas": [{"title": "A"}, {"ti') == [{"title": "A"}]
+        assert parser.feed('tle": "B"}') == [{"title": "B"}]
+        assert parser.feed(']}') == []
+
+    @pytest.mark.parametrize("split", range(1, 12))
+    def test_escapes_split_across_chunks(self, split):
+        text = '[{"title": "say \\\\\\"hi\\\\\\" [x]"}]'
+        assert feed_in_chunks(text, [split]) == json.loads(text)
+
+    def test_backslash_ending_a_chunk_escapes_the_next_quote(self):
+        parser = JSONArrayItemParser()
+
+        assert parser.feed('[{"title": "a\\') == []
+        assert parser.feed('"}"}]') == [{"title": 'a"}'}]
+
+    def test_nested_arrays_stay_inside_their_item(self):
+        text = '[{"features": [{"name": "x"}, {"name": "y"}], "tags": ["a", "b"]}]'
+
+        assert feed_in_chunks(text, [7, 13]) == json.loads(text)
+
+    def test_prose_and_code_fences_are_ignored(self):
+        text = 'Here you go:\n```json\n[{"title": "A"}, {"title": "B"}]\n```\nEnjoy!'
+
+        assert feed_in_chunks(text, [5, 20]) == [{"title": "A"}, {"title": "B"}]
+
+    def test_random_chunking_matches_json_loads(self):
+        rng = random.Random(0)
+        ideas = [{"title": f'idea "{i}" \\ [{i}]', "features": [{"x": i}], "n": i}
+                 for i in range(5)]
+        text = json.dumps({"ideas": ideas})
+        for _ in range(200):
+            sizes = [rng.randint(1, 8) for _ in range(len(text))]
+            assert feed_in_chunks(text, sizes) == ideas
+
+
+class FakeAnthropicStream:
+    """Async context manager yielding canned stream events"""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+
+class TestStreamAIResponse:
+    """Chunking and caching of streamed completions"""
+
+    @pytest.fixture
+    def agent(self, make_agent):
+        agent = make_agent(ValidationAgent)
+        agent.anthropic_client = MagicMock()
+        agent.anthropic_client.messages.stream.side_effect = lambda **params: FakeAnthropicStream([
+            SimpleNamespace(type="text", text="Hello"),
+            SimpleNamespace(type="content_block_stop"),
+            SimpleNamespace(type="text", text=" world")
+        ])
+        return agent
+
+    @pytest.mark.asyncio
+    async def test_text_events_are_yielded_and_cached(self, agent):
+        chunks = [chunk async for chunk in agent.stream_ai_response("prompt")]
+        again = [chunk async for chunk in agent.stream_ai_response("prompt")]
+
+        assert chunks == ["Hello", " world"]
+        assert again == ["Hello world"]
+        assert agent.anthropic_client.messages.stream.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_early_exit_does_not_cache_a_partial_response(self, agent):
+        stream = agent.stream_ai_response("prompt")
+        async with aclosing(stream):
+            async for chunk in stream:
+                break
+
+        scope, key = agent._cache_key("prompt", "anthropic")
+        assert agent.cache.get(key) is None
+
+    @pytest.mark.asyncio
+    async def test_tool_input_json_is_streamed_for_schemas(self, agent):
+        agent.anthropic_client.messages.stream.side_effect = lambda **params: FakeAnthropicStream([
+            SimpleNamespace(type="input_json", partial_json='{"ideas": [{"ti'),
+            SimpleNamespace(type="input_json", partial_json='tle": "A"}]}')
+        ])
+        schema = {"name": "submit_ideas", "schema": {"type": "object"}}
+
+        chunks = [chunk async for chunk in agent.stream_ai_response("prompt", json_schema=schema)]
+
+        params = agent.anthropic_client.messages.stream.call_args.kwargs
+        assert params["tool_choice"] == {"type": "tool", "name": "submit_ideas"}
+        assert json.loads("".join(chunks)) == {"ideas": [{"title": "A"}]}
+
+
+class TestStreamedIdeaGeneration:
+    """The idea coach's use of streamed responses"""
+
+    @pytest.fixture
+    def idea_coach(self, make_agent):
+        agent = make_agent(IdeaCoachAgent, agents={"num_ideas": 1})
+        agent.anthropic_client = MagicMock()
+        agent.anthropic_client.messages.stream.side_effect = lambda **params: FakeAnthropicStream([
+            SimpleNamespace(type="input_json", partial_json='{"ideas": [{"title": "A"}, '),
+            SimpleNamespace(type="input_json", partial_json='{"title": "B"}]}')
+        ])
+        return agent
+
+    @pytest.mark.asyncio
+    async def test_repeated_generation_is_served_from_cache(self, idea_coach):
+        first = await idea_coach.generate_ideas("tools for cooks", 1)
+        again = await idea_coach.generate_ideas("tools for cooks", 1)
+
+        assert [idea["title"] for idea in first["ideas"]] == ["A"]
+        assert [idea["title"] for idea in again["ideas"]] == ["A"]
+        assert idea_coach.anthropic_client.messages.stream.call_count == 1
@@ -11,44 +11,23 @@ Tests the weighted scoring system:
 """
 
 import pytest
-import asyncio
-import sys
-import os
-from unittest.mock import Mock, AsyncMock, patch
-
-# Add parent directory to path to import agents
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import random
+from unittest.mock import AsyncMock, patch
 
 from agents.validation import ValidationAgent
 
+# The weights used in the calculation
+WEIGHTS = {
+    "market": 0.3,
+    "competition": 0.25,
+    "technical": 0.25,
+    "financial": 0.2
+}
+
 
 class TestValidationScoringAlgorithm:
     """Test suite for validation scoring algorithm"""
     
-    @pytest.fixture
-    def mock_config(self):
-        """Mock configuration for testing"""
-        return {
-            "models": {
-                "default_provider": "anthropic",
-                "anthropic_model": "claude-3-5-sonnet-20241022"
-            }
-        }
-    
-    @pytest.fixture
-    def validation_agent(self, mock_config):
-        """Create ValidationAgent instance for testing"""
-        with patch('agents.base_agent.load_dotenv'), \
-             patch('agents.base_agent.os.getenv') as mock_getenv, \
-             patch('agents.base_agent.anthropic.Anthropic'), \
-             patch('agents.base_agent.openai.OpenAI'):
-            
-            # Mock environment variables
-            mock_getenv.side_effect = lambda key: "test_key" if "API_KEY" in key else None
-            
-            agent = ValidationAgent(mock_config)
-            return agent
-    
     @pytest.fixture
     def sample_idea(self):
         """Sample idea for testing"""
@@ -59,62 +38,36 @@ class TestValidationScoringAlgorithm:
         }
 
     # TEST 1: Weighted Score Calculation Accuracy
-    def test_calculate_validation_score_perfect_scores(self, validation_agent):
-        """Test scoring with perfect scores (all 10s)"""
-        scores = {
-            "market": 10,
-            "competition": 10, 
-            "technical": 10,
-            "financial": 10
-        }
-        
-        result = validation_agent._calculate_validation_score(scores)
-        expected = (10 * 0.3) + (10 * 0.25) + (10 * 0.25) + (10 * 0.2)  # = 10.0
-        
-        assert result == 10.0
-        assert isinstance(result, float)
-    
-    def test_calculate_validation_score_zero_scores(self, validation_agent):
-        """Test scoring with all zero scores"""
-        scores = {
-            "market": 0,
-            "competition": 0,
-            "technical": 0, 
-            "financial": 0
-        }
-        
+    @pytest.mark.parametrize("scores, expected", [
+        ({"market": 10, "competition": 10, "technical": 10, "financial": 10}, 10.0),
+        ({"market": 0, "competition": 0, "technical": 0, "financial": 0}, 0.0),
+        # 2.4 + 1.5 + 1.75 + 1.8
+        ({"market": 8, "competition": 6, "technical": 7, "financial": 9}, 7.45),
+        # Missing keys score zero
+        ({"market": 8, "competition": 6}, 3.9),
+        ({}, 0.0),
+        # Out-of-range scores are unusual but still weighted
+        ({"market": -2, "competition": 5, "technical": 8, "financial": 6}, 3.85),
+        ({"market": 15, "competition": 8, "technical": 7, "financial": 6}, 9.45),
+    ])
+    def test_calculate_validation_score(self, validation_agent, scores, expected):
+        """Test that weights are applied to each score"""
         result = validation_agent._calculate_validation_score(scores)
-        expected = 0.0
-        
+
         assert result == expected
-    
-    def test_calculate_validation_score_weighted_distribution(self, validation_agent):
-        """Test that weights are correctly applied"""
-        scores = {
-            "market": 8,      # 30% weight = 2.4
-            "competition": 6,  # 25% weight = 1.5
-            "technical": 7,   # 25% weight = 1.75
-            "financial": 9    # 20% weight = 1.8
-        }
-        
-        result = validation_agent._calculate_validation_score(scores)
-        expected = (8 * 0.3) + (6 * 0.25) + (7 * 0.25) + (9 * 0.2)  # = 7.45
-        
-        assert result == 7.45
-    
-    def test_calculate_validation_score_missing_keys(self, validation_agent):
-        """Test scoring handles missing score keys gracefully"""
-        scores = {
-            "market": 8,
-            "competition": 6
-            # Missing technical and financial
-        }
-        
-        result = validation_agent._calculate_validation_score(scores)
-        expected = (8 * 0.3) + (6 * 0.25) + (0 * 0.25) + (0 * 0.2)  # = 3.9
-        
-        assert result == 3.9
-    
+        assert isinstance(result, float)
+
+    def test_calculate_validation_score_weighted_sum_invariant(self, validation_agent):
+        """Test random score sets against the weighted sum, rounded to 2 places"""
+        rng = random.Random(1234)
+        for _ in range(2000):
+            scores = {key: rng.uniform(-1e6, 1e6) for key in WEIGHTS if rng.random() < 0.9}
+
+            result = validation_agent._calculate_validation_score(scores)
+
+            expected = round(sum(scores.get(key, 0) * weight for key, weight in WEIGHTS.items()), 2)
+            assert result == pytest.approx(expected, abs=1e-9)
+
     def test_calculate_validation_score_rounding(self, validation_agent):
         """Test that scores are properly rounded to 2 decimal places"""
         scores = {
@@ -126,20 +79,12 @@ class TestValidationScoringAlgorithm:
         
         result = validation_agent._calculate_validation_score(scores)
         # Should be rounded to 2 decimal places
-        assert len(str(result).split('.')[-1]) <= 2
+        assert result == pytest.approx(round(result, 2), abs=1e-9)
     
     # TEST 2: Weight Distribution Validation
     def test_weight_sum_equals_one(self, validation_agent):
         """Test that all weights sum to 1.0 (100%)"""
-        # Access the weights used in the calculation
-        weights = {
-            "market": 0.3,
-            "competition": 0.25,
-            "technical": 0.25,
-            "financial": 0.2
-        }
-        
-        total_weight = sum(weights.values())
+        total_weight = sum(WEIGHTS.values())
         assert total_weight == 1.0
     
     def test_market_weight_highest(self, validation_agent):
@@ -168,44 +113,6 @@ class TestValidationScoringAlgorithm:
         assert other_result == 7.0
         assert other_result > market_result  # But others combined outweigh market
     
-    # TEST 3: Edge Cases and Error Handling
-    def test_calculate_validation_score_negative_values(self, validation_agent):
-        """Test handling of negative scores (should work but unusual)"""
-        scores = {
-            "market": -2,
-            "competition": 5,
-            "technical": 8,
-            "financial": 6
-        }
-        
-        result = validation_agent._calculate_validation_score(scores)
-        expected = (-2 * 0.3) + (5 * 0.25) + (8 * 0.25) + (6 * 0.2)  # = 3.85
-        
-        assert result == 3.85
-    
-    def test_calculate_validation_score_values_above_ten(self, validation_agent):
-        """Test handling of scores above 10 (should work but unusual)"""
-        scores = {
-            "market": 15,
-            "competition": 8,
-            "technical": 7,
-            "financial": 6
-        }
-        
-        result = validation_agent._calculate_validation_score(scores)
-        expected = (15 * 0.3) + (8 * 0.25) + (7 * 0.25) + (6 * 0.2)  # = 9.45
-        
-        assert result == 9.45
-    
-    def test_calculate_validation_score_empty_dict(self, validation_agent):
-        """Test scoring with empty scores dictionary"""
-        scores = {}
-        
-        result = validation_agent._calculate_validation_score(scores)
-        expected = 0.0
-        
-        assert result == expected
-    
     # TEST 4: Recommendation Generation Based on Scores
     def test_generate_recommendations_high_score(self, validation_agent):
         """Test recommendations for high overall scores (≥8)"""
@@ -297,19 +204,22 @@ class TestValidationScoringAlgorithm:
     async def test_full_validation_workflow_scoring(self, validation_agent, sample_idea):
         """Integration test for full validation workflow with mocked AI responses"""
         
-        # Mock AI responses for each analysis
-        mock_responses = [
-            '{"score": 8, "analysis": "Strong market potential", "key_insights": ["Growing market"]}',  # Market
-            '{"score": 7, "competitors": ["CompetitorA"], "advantages": ["Unique approach"], "threats": ["Market entry"]}',  # Competition
-            '{"score": 6, "complexity": "Medium", "technologies": ["AI", "Web"], "timeline": "6 months"}',  # Technical
-            '{"score": 9, "revenue_potential": "High", "investment_needed": "Medium", "roi_timeline": "18 months"}'  # Financial
-        ]
+        # Mock the structured AI response carrying all four analyses
+        mock_response = {
+            "market_analysis": {"score": 8, "analysis": "Strong market potential", "key_insights": ["Growing market"]},
+            "competitive_analysis": {"score": 7, "competitors": ["CompetitorA"], "advantages": ["Unique approach"], "threats": ["Market entry"]},
+            "technical_feasibility": {"score": 6, "complexity": "Medium", "timeline": "6 months", "risks": []},
+            "financial_analysis": {"score": 9, "revenue_potential": "High", "investment_needed": "Medium", "roi_timeline": "18 months"}
+        }
         
-        with patch.object(validation_agent, 'get_ai_response', side_effect=mock_responses):
+        with patch.object(validation_agent, 'get_ai_response', return_value=mock_response) as mock_call:
             result = await validation_agent._comprehensive_validation(sample_idea, [])
             
+            # All four analyses come from a single AI call
+            assert mock_call.await_count == 1
+            
             # Check that overall score is calculated correctly
-            expected_score = (8 * 0.3) + (7 * 0.25) + (6 * 0.25) + (9 * 0.2)  # = 7.45
+            # (8 * 0.3) + (7 * 0.25) + (6 * 0.25) + (9 * 0.2)
             assert result["overall_score"] == 7.45
             
             # Check that all components are present
@@ -324,20 +234,6 @@ class TestValidationScoringAlgorithm:
 class TestValidationScoringPerformance:
     """Performance and boundary tests for the scoring algorithm"""
     
-    @pytest.fixture
-    def validation_agent(self):
-        """Create ValidationAgent for performance testing"""
-        with patch('agents.base_agent.load_dotenv'), \
-             patch('agents.base_agent.os.getenv') as mock_getenv, \
-             patch('agents.base_agent.anthropic.Anthropic'), \
-             patch('agents.base_agent.openai.OpenAI'):
-            
-            mock_getenv.side_effect = lambda key: "test_key" if "API_KEY" in key else None
-            
-            config = {"models": {"default_provider": "anthropic"}}
-            agent = ValidationAgent(config)
-            return agent
-    
     def test_scoring_performance_large_numbers(self, validation_agent):
         """Test performance with very large score values"""
         scores = {
@@ -366,8 +262,89 @@ class TestValidationScoringPerformance:
         
         # Should handle precision correctly and round to 2 decimal places
         assert isinstance(result, float)
-        decimal_places = len(str(result).split('.')[-1])
-        assert decimal_places <= 2
+        assert result == pytest.approx(round(result, 2), abs=1e-9)
+
+
+
+def batch_entry(number, score):
+    """One entry of a structured batch validation response"""
+    return {
+        "idea_number": number,
+        "market_analysis": {"score": score, "analysis": "", "key_insights": []},
+        "competitive_analysis": {"score": score, "competitors": [], "advantages": [], "threats": []},
+        "technical_feasibility": {"score": score, "complexity": "Low", "timeline": "", "risks": []},
+        "financial_analysis": {"score": score, "revenue_potential": "", "investment_needed": "", "roi_timeline": ""}
+    }
+
+
+class TestBatchValidation:
+    """validate_ideas_batch maps one structured response back onto the ideas"""
+    
+    @pytest.fixture
+    def validation_agent(self, make_agent):
+        return make_agent(ValidationAgent)
+    
+    @pytest.fixture
+    def ideas(self):
+        return [{"id": "idea_1760512345.123456_0", "title": "A"},
+                {"id": "idea_1760512345.123456_1", "title": "B"}]
+    
+    @pytest.mark.asyncio
+    async def test_results_are_matched_by_idea_number(self, validation_agent, ideas):
+        response = {"validations": [batch_entry(2, 4), batch_entry(1, 8)]}
+        validation_agent.get_ai_response = AsyncMock(return_value=response)
+        
+        results = await validation_agent.validate_ideas_batch(ideas)
+        
+        assert [r["validation_results"]["overall_score"] for r in results] == [8.0, 4.0]
+        assert validation_agent.get_ai_response.await_count == 1
+        prompt = validation_agent.get_ai_response.await_args.args[0]
+        assert "Idea 1:\nTitle: A" in prompt and "Idea 2:\nTitle: B" in prompt
+    
+    @pytest.mark.asyncio
+    async def test_missing_entry_fails_only_that_idea(self, validation_agent, ideas):
+        response = {"validations": [batch_entry(1, 7)]}
+        validation_agent.get_ai_response = AsyncMock(return_value=response)
+        
+        first, second = await validation_agent.validate_ideas_batch(ideas)
+        
+        assert first["success"] is True
+        assert second == {
+            "success": False,
+            "error": "No validation returned for idea",
+            "agent_id": validation_agent.agent_id,
+            "processing_time": second["processing_time"]
+        }
+    
+    @pytest.mark.asyncio
+    async def test_provider_error_fails_every_idea(self, validation_agent, ideas):
+        validation_agent.get_ai_response = AsyncMock(side_effect=Exception("AI response error: down"))
+        
+        results = await validation_agent.validate_ideas_batch(ideas)
+        
+        assert [r["success"] for r in results] == [False, False]
+        assert all(r["error"] == "AI response error: down" for r in results)
+        assert validation_agent.status == "error"
+    
+    @pytest.mark.asyncio
+    async def test_repeat_validation_of_an_idea_is_cached(self, validation_agent, ideas):
+        result = {"success": True, "validation_results": {"overall_score": 7.0}}
+        validation_agent.execute_task = AsyncMock(return_value=result)
+        
+        first = await validation_agent.validate_idea(ideas[0], "s1")
+        again = await validation_agent.validate_idea(dict(reversed(ideas[0].items())), "s2")
+        
+        assert first == again == result
+        assert validation_agent.execute_task.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_failed_validation_is_not_cached(self, validation_agent, ideas):
+        validation_agent.execute_task = AsyncMock(return_value={"success": False, "error": "down"})
+        
+        await validation_agent.validate_idea(ideas[0])
+        await validation_agent.validate_idea(ideas[0])
+        
+        assert validation_agent.execute_task.await_count == 2
 
 
 if __name__ == "__main__":